@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""抖音下载流程耗时对比：旧流程（两次详情请求 + 目录遍历）vs 单次请求流程
+
+需要可用的抖音 cookie（默认读取 config/config.yaml 中的 douyin.cookie）和网络连接。
+每个链接分别用两种流程下载一次，统计每个链接的耗时和作品详情请求次数。
+
+用法：
+    python benchmarks/bench_douyin_pipeline.py https://v.douyin.com/xxxx/ https://v.douyin.com/yyyy/
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import statistics
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from f2.apps.douyin.crawler import DouyinCrawler
+from f2.apps.douyin.handler import DouyinHandler
+from f2.apps.douyin.utils import AwemeIdFetcher
+from src.config.config_loader import load_config
+from src.constants import DOUYIN_DEST_DIR
+from src.handlers.douyin_handler import CustomDouyinHandler
+from src.services.download_index import DownloadIndex
+from src.services.short_link_resolver import ShortLinkResolver
+
+# 统计作品详情请求次数
+detail_requests = 0
+_fetch_post_detail = DouyinCrawler.fetch_post_detail
+
+
+async def _counting_fetch_post_detail(self, *args, **kwargs):
+    global detail_requests
+    detail_requests += 1
+    return await _fetch_post_detail(self, *args, **kwargs)
+
+
+DouyinCrawler.fetch_post_detail = _counting_fetch_post_detail
+
+
+async def legacy_pipeline(handler, url):
+    """旧流程：handle_one_video 下载后再次解析ID、请求详情，并遍历临时目录查找文件"""
+    config = handler.get_download_config(url)
+    await DouyinHandler(config).handle_one_video()
+    aweme_id = await AwemeIdFetcher.get_aweme_id(url)
+    video = (await DouyinHandler(config).fetch_one_video(aweme_id))._to_dict()
+
+    create = video.get("create_time", "")
+    nickname = video.get("nickname", "")
+    for root, dirs, files in os.walk(handler.download_path):
+        for file in files:
+            if nickname and nickname in file and create and create in file:
+                dest_path = os.path.join(DOUYIN_DEST_DIR, f"legacy_{file}")
+                shutil.move(os.path.join(root, file), dest_path)
+                shutil.rmtree(root, ignore_errors=True)
+                return dest_path
+    return None
+
+
+async def current_pipeline(handler, url):
+    video = await handler.download_video(url)
+    return video.get("dest_path") if video else None
+
+
+async def measure(name, pipeline, handler, urls):
+    global detail_requests
+    latencies = []
+    requests = 0
+    for url in urls:
+        detail_requests = 0
+        start = time.perf_counter()
+        path = await pipeline(handler, url)
+        latencies.append(time.perf_counter() - start)
+        requests += detail_requests
+        if path and os.path.exists(path):
+            os.remove(path)
+        else:
+            print(f"  {name}: {url} 下载失败")
+    print(
+        f"{name:<8} 平均 {statistics.mean(latencies):6.2f} s  "
+        f"中位数 {statistics.median(latencies):6.2f} s  "
+        f"最慢 {max(latencies):6.2f} s  "
+        f"详情请求 {requests / len(urls):.1f} 次/链接"
+    )
+
+
+async def run(args):
+    cookie = args.cookie or load_config().get("douyin", {}).get("cookie")
+    # 使用不落盘的缓存和索引，避免结果被复用
+    handler = CustomDouyinHandler(
+        cookie,
+        short_links=ShortLinkResolver(path=None),
+        download_index=DownloadIndex(path=None),
+    )
+    os.makedirs(DOUYIN_DEST_DIR, exist_ok=True)
+    print(f"链接数: {len(args.urls)}")
+    await measure("旧流程", legacy_pipeline, handler, args.urls)
+    await measure("新流程", current_pipeline, handler, args.urls)
+    await handler.http.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("urls", nargs="+", help="抖音分享链接")
+    parser.add_argument("--cookie", help="抖音 cookie，默认读取配置文件")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
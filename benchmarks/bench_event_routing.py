@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""消息路由性能测试：用本地假客户端驱动转发处理器
+
+不连接 Telegram：假客户端记录 register_message_transfer / register_handlers
+注册的处理器，像 Telethon 一样为每条合成的 NewMessage 事件依次调用它们；
+iter_dialogs、forward_messages、send_message 只在本地模拟（可设置网络延迟）。
+输出整条事件处理链路以及规则查找、关键词扫描、实体解析、发送各阶段的
+吞吐和 p50/p99 延迟。
+
+相同参数和随机种子生成的消息完全相同，用 --json 保存结果后，可在其他提交上
+用 --compare 对比。
+
+用法：
+    python benchmarks/bench_event_routing.py --rules 100 --keywords 50 --chats 200
+    python benchmarks/bench_event_routing.py --json before.json
+    python benchmarks/bench_event_routing.py --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import functools
+import subprocess
+from telethon import events, types, utils
+
+# 添加项目根目录到系统路径
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.handlers.event_handler import EventHandler
+
+ALPHABET = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研质"
+
+# user: 用户客户端（register_message_transfer），bot: 机器人客户端（register_handlers）
+SCENARIOS = ("user", "bot")
+STAGES = ("event", "lookup", "scan", "resolve", "send")
+STAGE_NAMES = {
+    "event": "整条事件",
+    "lookup": "规则查找",
+    "scan": "关键词扫描",
+    "resolve": "实体解析",
+    "send": "发送/转发",
+}
+
+
+def random_words(rng, count, min_len=2, max_len=5):
+    return [
+        "".join(rng.choice(ALPHABET) for _ in range(rng.randint(min_len, max_len)))
+        for _ in range(count)
+    ]
+
+
+def make_channel(channel_id, title):
+    return types.Channel(
+        id=channel_id,
+        title=title,
+        photo=types.ChatPhotoEmpty(),
+        date=None,
+        access_hash=channel_id * 7919,
+    )
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------------------------
+# 假客户端和事件
+# ----------------------------------------------------------------------
+class FakeSession:
+    # 没有会话文件，实体索引不落盘
+    filename = None
+
+
+class FakeDialog:
+    def __init__(self, entity):
+        self.entity = entity
+
+
+class FakeMessage:
+    def __init__(self, message_id, text):
+        self.id = message_id
+        self.text = text
+        self.message = text
+        self.grouped_id = None
+        self.photo = None
+        self.media = None
+
+
+class FakeEvent:
+    """NewMessage 事件替身，聊天实体已随更新下发"""
+
+    def __init__(self, client, chat, message):
+        self.client = client
+        self.chat = chat
+        self.chat_id = utils.get_peer_id(chat)
+        self.sender = None
+        self.message = message
+
+    async def get_chat(self):
+        return self.chat
+
+    async def reply(self, text):
+        return await self.client.send_message(self.chat_id, text)
+
+
+class FakeClient:
+    """只实现转发链路用到的接口的 Telethon 客户端替身"""
+
+    def __init__(self, dialogs, rpc_latency=0.0):
+        self.session = FakeSession()
+        self.rpc_latency = rpc_latency
+        self._dialogs = dialogs
+        self._handlers = []
+        self.sent = 0
+
+    def on(self, builder):
+        def decorator(callback):
+            self._handlers.append((builder, callback))
+            return callback
+
+        return decorator
+
+    async def _rpc(self):
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+
+    async def get_input_entity(self, peer):
+        # 会话缓存为空，数字ID由实体索引遍历对话列表获得
+        raise ValueError(f"Could not find the input entity for {peer}")
+
+    async def get_entity(self, peer):
+        await self._rpc()
+        raise ValueError(f"Cannot find any entity corresponding to {peer}")
+
+    async def iter_dialogs(self):
+        await self._rpc()
+        for entity in self._dialogs:
+            yield FakeDialog(entity)
+
+    async def forward_messages(self, entity, messages, from_peer=None):
+        await self._rpc()
+        self.sent += 1
+
+    async def send_message(self, entity, message="", **kwargs):
+        await self._rpc()
+        self.sent += 1
+
+    async def send_file(self, entity, file, **kwargs):
+        await self._rpc()
+        self.sent += 1
+
+    @staticmethod
+    def _matches(builder, event):
+        if builder is events.NewMessage:
+            return True
+        if isinstance(builder, events.NewMessage):
+            return builder.pattern is None or bool(builder.pattern(event.message.text))
+        # Album、ChatAction 等事件不在测试范围内
+        return False
+
+    async def dispatch(self, event):
+        """与 Telethon 相同：按注册顺序调用匹配的处理器，处理器异常只记录"""
+        for builder, callback in self._handlers:
+            if self._matches(builder, event):
+                try:
+                    await callback(event)
+                except Exception as e:
+                    logging.getLogger(__name__).error(f"处理器出错: {str(e)}")
+
+
+# ----------------------------------------------------------------------
+# 阶段计时
+# ----------------------------------------------------------------------
+class StageTimer:
+    """替换对象上的方法，记录每次调用的耗时"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.enabled = False
+
+    def record(self, stage, seconds):
+        if self.enabled:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, obj, name, stage):
+        func = getattr(obj, name)
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        else:
+
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, name, timed)
+
+
+# ----------------------------------------------------------------------
+# 工作负载
+# ----------------------------------------------------------------------
+def build_workload(args):
+    """生成聊天、目标频道、转发规则和消息，只由参数和随机种子决定"""
+    rng = random.Random(args.seed)
+    chats = [make_channel(1000 + idx, f"source{idx}") for idx in range(args.chats)]
+    targets = [
+        make_channel(900000 + idx, f"target{idx}") for idx in range(args.targets)
+    ]
+
+    rules = []
+    keywords_by_chat = {}
+    for idx in range(args.rules):
+        chat = chats[idx % len(chats)]
+        include_keywords = random_words(rng, args.keywords)
+        rules.append(
+            {
+                "source_chat": utils.get_peer_id(chat),
+                "target_chat": utils.get_peer_id(targets[idx % len(targets)]),
+                "include_keywords": include_keywords,
+                "exclude_words": random_words(rng, args.keywords // 4, 6, 8),
+                "direct": False,
+            }
+        )
+        keywords_by_chat.setdefault(chat.id, []).extend(include_keywords)
+
+    messages = []
+    for message_id in range(1, args.warmup + args.messages + 1):
+        chat = rng.choice(chats)
+        words = random_words(rng, rng.randint(5, 30))
+        keywords = keywords_by_chat.get(chat.id)
+        if keywords and rng.random() < args.hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        messages.append((chat, FakeMessage(message_id, "".join(words))))
+    # 目标频道和全部源聊天都在对话列表中
+    return rules, targets + chats, messages
+
+
+def build_handler(scenario, rules, client, timer):
+    config = {
+        "transfer_message": rules,
+        "youtube_download": {},
+        "download_queue": {},
+        "allowed_chat_ids": [],
+    }
+    handler = EventHandler(config)
+    if scenario == "user":
+        handler.register_message_transfer(client)
+    else:
+        handler.register_handlers(client)
+
+    timer.wrap(handler.transfer_rules, "rules_for_id", "lookup")
+    timer.wrap(handler.transfer_rules, "cached_rules_for", "lookup")
+    timer.wrap(handler.transfer_rules, "resolve", "lookup")
+    timer.wrap(handler.transfer_rules, "scan", "scan")
+    timer.wrap(handler, "get_entity_safely", "resolve")
+    for name in ("forward_messages", "send_message", "send_file"):
+        timer.wrap(client, name, "send")
+    return handler
+
+
+async def run_scenario(scenario, args, rules, dialogs, messages):
+    timer = StageTimer()
+    client = FakeClient(dialogs, args.rpc_latency_ms / 1000)
+    build_handler(scenario, rules, client, timer)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def handle(chat, message):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.dispatch(FakeEvent(client, chat, message))
+            timer.record("event", time.perf_counter() - start)
+
+    async def run_batch(batch):
+        # Telethon 为每个更新创建一个任务，这里同样并发分发
+        await asyncio.gather(*(handle(chat, message) for chat, message in batch))
+
+    # 预热：完成首次对话遍历和实体缓存，只测量稳定状态
+    await run_batch(messages[: args.warmup])
+    client.sent = 0
+    timer.enabled = True
+    start = time.perf_counter()
+    await run_batch(messages[args.warmup :])
+    elapsed = time.perf_counter() - start
+
+    measured = len(messages) - args.warmup
+    stages = {}
+    for stage in STAGES:
+        samples = timer.samples[stage]
+        stages[stage] = {
+            "count": len(samples),
+            "p50_us": percentile(samples, 50) * 1e6,
+            "p99_us": percentile(samples, 99) * 1e6,
+        }
+    return {
+        "messages": measured,
+        "sent": client.sent,
+        "seconds": elapsed,
+        "throughput": measured / elapsed if elapsed else 0.0,
+        "stages": stages,
+    }
+
+
+def print_result(scenario, result, baseline=None):
+    line = (
+        f"[{scenario}] {result['throughput']:10.1f} 条/秒  "
+        f"{result['messages']} 条消息, 发送 {result['sent']} 次"
+    )
+    if baseline:
+        line += f"  ({result['throughput'] / baseline['throughput']:.2f}x)"
+    print(line)
+    for stage in STAGES:
+        data = result["stages"][stage]
+        if not data["count"]:
+            continue
+        line = (
+            f"    {STAGE_NAMES[stage]:<8} 次数 {data['count']:>7}  "
+            f"p50 {data['p50_us']:9.1f} µs  p99 {data['p99_us']:9.1f} µs"
+        )
+        base = baseline and baseline["stages"].get(stage)
+        if base and base["count"]:
+            line += (
+                f"  (p50 {data['p50_us'] / base['p50_us']:.2f}x, "
+                f"p99 {data['p99_us'] / base['p99_us']:.2f}x)"
+            )
+        print(line)
+
+
+async def run(args):
+    rules, dialogs, messages = build_workload(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["params"] != vars(args) | {"json": None, "compare": None}:
+            print("警告: 对比结果使用的参数不同，数据不可直接比较")
+
+    print(
+        f"规则数: {args.rules}  每条关键词: {args.keywords}  聊天数: {args.chats}  "
+        f"目标数: {args.targets}  消息数: {args.messages}  命中率: {args.hit_rate}  "
+        f"并发: {args.concurrency}  模拟延迟: {args.rpc_latency_ms} ms"
+    )
+    if baseline:
+        print(f"对比基准: {baseline.get('commit') or '未知提交'}")
+
+    results = {}
+    for scenario in args.scenarios:
+        results[scenario] = await run_scenario(scenario, args, rules, dialogs, messages)
+        print_result(
+            scenario,
+            results[scenario],
+            baseline and baseline["results"].get(scenario),
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "params": vars(args) | {"json": None, "compare": None},
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"结果已保存到 {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=50, help="转发规则数量")
+    parser.add_argument("--keywords", type=int, default=20, help="每条规则的关键词数")
+    parser.add_argument("--chats", type=int, default=100, help="发送消息的聊天数量")
+    parser.add_argument("--targets", type=int, default=10, help="目标频道数量")
+    parser.add_argument("--messages", type=int, default=5000, help="测量的消息数量")
+    parser.add_argument("--warmup", type=int, default=200, help="预热消息数量")
+    parser.add_argument(
+        "--hit-rate", type=float, default=0.3, help="有规则的聊天中包含关键词的消息比例"
+    )
+    parser.add_argument("--concurrency", type=int, default=16, help="同时处理的事件数")
+    parser.add_argument(
+        "--rpc-latency-ms", type=float, default=0.0, help="模拟每次网络请求的延迟"
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="将结果保存为JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    args = parser.parse_args()
+
+    # 转发日志会淹没输出，也会计入耗时
+    logging.basicConfig(level=logging.ERROR)
+    # 处理器初始化时会创建下载目录和缓存文件，放到临时目录中
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.json:
+            args.json = os.path.abspath(args.json)
+        if args.compare:
+            args.compare = os.path.abspath(args.compare)
+        os.chdir(work_dir)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""关键词过滤性能对比：逐条子串查找 vs KeywordMatcher
+
+用法：
+    python benchmarks/bench_keyword_matcher.py --rules 100 --keywords 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.transfer_rules import TransferRuleIndex
+
+ALPHABET = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研质"
+
+
+def random_words(rng, count, min_len=2, max_len=5):
+    return [
+        "".join(rng.choice(ALPHABET) for _ in range(rng.randint(min_len, max_len)))
+        for _ in range(count)
+    ]
+
+
+def build_rules(rng, rule_count, keyword_count):
+    rules = []
+    for idx in range(rule_count):
+        rules.append(
+            {
+                "source_chat": -1000000000000 - idx,
+                "target_chat": "@target",
+                "include_keywords": random_words(rng, keyword_count),
+                "exclude_words": random_words(rng, keyword_count // 4),
+            }
+        )
+    return rules
+
+
+def substring_filter(rules, text):
+    """原实现：逐条规则、逐个关键词做子串查找"""
+    matched = 0
+    for transfer in rules:
+        exclude_words = transfer.get("exclude_words", [])
+        include_keywords = transfer.get("include_keywords", [])
+        if exclude_words and any(word in text for word in exclude_words):
+            continue
+        if include_keywords and not any(word in text for word in include_keywords):
+            continue
+        matched += 1
+    return matched
+
+
+def matcher_filter(index, text):
+    """新实现：一次扫描得到命中集合，再逐条规则做集合判断"""
+    hits = index.matcher.scan(text)
+    matched = 0
+    for rule in index.rules:
+        if rule.is_excluded(hits) or not rule.is_included(hits):
+            continue
+        matched += 1
+    return matched
+
+
+def bench(func, arg, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(arg, text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=50, help="规则数量")
+    parser.add_argument("--keywords", type=int, default=200, help="每条规则的关键词数")
+    parser.add_argument("--messages", type=int, default=500, help="消息数量")
+    parser.add_argument("--length", type=int, default=300, help="消息平均长度")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最好成绩）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = build_rules(rng, args.rules, args.keywords)
+    texts = [
+        "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 2 * args.length)))
+        for _ in range(args.messages)
+    ]
+
+    start = time.perf_counter()
+    index = TransferRuleIndex(rules)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # 两种实现的结果必须一致
+    for text in texts:
+        assert substring_filter(rules, text) == matcher_filter(index, text)
+
+    baseline = bench(substring_filter, rules, texts, args.repeat)
+    compiled = bench(matcher_filter, index, texts, args.repeat)
+
+    print(
+        f"规则数: {args.rules}  每条关键词: {args.keywords}  "
+        f"消息数: {args.messages}  平均长度: {args.length}"
+    )
+    print(f"匹配器构建耗时: {build_ms:.1f} ms（共 {len(index.matcher)} 个关键词）")
+    print(f"子串循环:       {baseline:10.1f} 条/秒")
+    print(f"KeywordMatcher: {compiled:10.1f} 条/秒  ({compiled / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Telegram 大文件下载性能对比：download_media vs 多连接并行下载
+
+需要已登录的用户会话（config/<session_name>.session），以及一条包含大文件的消息。
+
+用法：
+    python benchmarks/bench_telegram_download.py --chat @channel --message 123 --connections 4 8
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from telethon import TelegramClient
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.config.config_loader import load_config
+from src.constants import CONFIG_DIR
+from src.utils.fast_transfer import download_file_parallel
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def report(name, size, elapsed):
+    print(f"{name:<24} {elapsed:8.2f} s  {size / elapsed / 1024 / 1024:8.2f} MB/s")
+
+
+async def run(args):
+    config = load_config()
+    session_file = os.path.join(CONFIG_DIR, config["user_account"]["session_name"])
+    client = TelegramClient(session_file, config["api_id"], config["api_hash"])
+    await client.start()
+    try:
+        chat = int(args.chat) if args.chat.lstrip("-").isdigit() else args.chat
+        message = await client.get_messages(chat, ids=args.message)
+        if not message or not message.document:
+            print("消息不存在或不包含文件")
+            return 1
+        size = message.document.size
+        print(f"文件大小: {size / 1024 / 1024:.1f} MB  分片大小: {args.part_size} KB")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            baseline_path = os.path.join(temp_dir, "baseline")
+            start = time.perf_counter()
+            await client.download_media(message, file=baseline_path)
+            report("download_media", size, time.perf_counter() - start)
+            expected = sha256(baseline_path)
+            os.remove(baseline_path)
+
+            for connections in args.connections:
+                path = os.path.join(temp_dir, f"parallel_{connections}")
+                start = time.perf_counter()
+                _, part_retries = await download_file_parallel(
+                    client,
+                    message.media,
+                    path,
+                    part_size=args.part_size * 1024,
+                    connections=connections,
+                )
+                elapsed = time.perf_counter() - start
+                # 两种方式下载的内容必须一致
+                assert sha256(path) == expected, "并行下载的文件内容不一致"
+                os.remove(path)
+                retries = sum(part_retries.values())
+                report(f"parallel x{connections} (重试 {retries})", size, elapsed)
+    finally:
+        await client.disconnect()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chat", required=True, help="消息所在聊天的ID或用户名")
+    parser.add_argument("--message", type=int, required=True, help="消息ID")
+    parser.add_argument(
+        "--connections", type=int, nargs="+", default=[2, 4, 8], help="并行连接数"
+    )
+    parser.add_argument("--part-size", type=int, default=512, help="分片大小（KB）")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 
 from src.handlers.channel_transfer_handler import ChannelTransferHandler
 from src.config.config_loader import load_config
+from src.services.entity_index import get_entity_index
+from src.services.checkpoint_store import TransferCheckpointStore
+from src.services.rate_limiter import RateLimiter
 
 # 配置日志
 logging.basicConfig(
@@ -33,24 +36,16 @@ DIRECT = True  # 是否直接转发消息
 async def get_entity_safely(client, entity_id):
     """安全获取实体，处理各种可能的错误情况"""
     try:
-        # 如果是整数ID，尝试直接通过对话列表查找
-        if isinstance(entity_id, int) or (
-            isinstance(entity_id, str) and entity_id.startswith("-100")
-        ):
-            entity_id = int(entity_id)
-            # 遍历对话列表查找匹配的ID
-            async for dialog in client.iter_dialogs():
-                if dialog.id == entity_id:
-                    logger.info(f"已找到频道: {dialog.name} (ID: {dialog.id})")
-                    return dialog.entity
-
-            # 如果遍历完所有对话后仍未找到
+        # 通过持久化的实体索引解析，避免每次运行都遍历对话列表
+        entity = await get_entity_index(client).resolve(client, entity_id)
+        if entity is None:
             logger.error(f"未找到ID为 {entity_id} 的频道，请确认您已加入该频道")
             return None
-        else:
-            # 对于用户名，可以直接使用get_entity
-            entity = await client.get_entity(entity_id)
-            return entity
+        # 索引可能只返回InputPeer，这里换成完整实体以便显示频道名称
+        if not hasattr(entity, "title"):
+            entity = await client.get_entity(entity)
+            get_entity_index(client).remember(entity)
+        return entity
 
     except errors.FloodWaitError as e:
         logger.error(f"请求过于频繁，需要等待 {e.seconds} 秒")
@@ -68,6 +63,7 @@ async def get_entity_safely(client, entity_id):
 
 async def main():
     """主程序入口"""
+    checkpoint_store = None
     try:
         # 加载配置
         config = load_config()
@@ -87,6 +83,10 @@ async def main():
 
         logger.info("客户端连接成功")
 
+        # 解析实体和转发共用同一个限速器
+        rate_limiter = RateLimiter(config.get("rate_limit"))
+        rate_limiter.install(client, "user")
+
         # 安全获取源频道和目标频道实体
         source_entity = await get_entity_safely(client, SOURCE_CHANNEL)
         if not source_entity:
@@ -102,8 +102,13 @@ async def main():
             logger.info("提示：可以运行 list_channels.py 查看您有权限访问的所有频道")
             return 1
 
-        # 创建频道转发处理器
-        handler = ChannelTransferHandler(client)
+        get_entity_index(client).save()
+
+        # 创建频道转发处理器，转发断点保存在配置目录中，重启后从断点继续
+        checkpoint_store = TransferCheckpointStore(
+            os.path.join(CONFIG_DIR, "transfer_checkpoints.db")
+        )
+        handler = ChannelTransferHandler(client, checkpoint_store, rate_limiter)
 
         # 解析日期字符串
         try:
@@ -143,6 +148,8 @@ async def main():
         return 1
 
     finally:
+        if checkpoint_store:
+            await checkpoint_store.close()
         # 断开客户端连接
         await client.disconnect()
         logger.info("客户端已断开连接")
@@ -5,6 +5,9 @@ import signal
 from src.config.config_loader import load_config
 from src.services.client_service import ClientService
 from src.services.scheduler_service import SchedulerService
+from src.services.rate_limiter import RateLimiter
+from src.services.metrics import MetricsServer
+from src.services.entity_index import save_entity_indexes
 from src.handlers.event_handler import EventHandler
 from src.utils.file_utils import ensure_dirs
 from src.constants import (
@@ -56,6 +59,20 @@ async def main():
         if not (user_client or bot_client):
             raise ValueError("未启用任何客户端，请在配置文件中至少启用一个客户端")
 
+        # 运行指标服务（可选）
+        metrics_server = None
+        metrics_config = config.get("metrics") or {}
+        if metrics_config.get("enabled"):
+            metrics_server = MetricsServer(metrics_config)
+            await metrics_server.start()
+
+        # 所有客户端的请求共用一个限速器
+        rate_limiter = RateLimiter(config.get("rate_limit"))
+        if user_client:
+            rate_limiter.install(user_client, "user")
+        if bot_client:
+            rate_limiter.install(bot_client, "bot")
+
         # 注册事件处理器
         if bot_client:
             event_handler.register_handlers(bot_client)
@@ -88,8 +105,15 @@ async def main():
             # 关闭客户端
             await client_service.disconnect_all()
 
-            # 关闭调度器
+            # 关闭HTTP连接池，保存短链接缓存和实体索引
+            await event_handler.http_client.close()
+            event_handler.short_links.save()
+            save_entity_indexes()
+
+            # 关闭调度器和指标服务
             scheduler_service.shutdown()
+            if metrics_server:
+                await metrics_server.close()
 
             loop.stop()
 
@@ -27,23 +27,74 @@ def load_config():
             "format": "bv*+ba/best",
             "cookies": "",
             "download_list": False,
+            "playlist_concurrency": 3,
+            "playlist_retries": 1,
         },
         "allowed_chat_ids": [],
         "scheduled_messages": [],
         "transfer_message": [],
+        "entity_cache": {
+            "max_size": 5000,
+            "ttl_hours": 168,
+            "negative_ttl_minutes": 10,
+            "sweep_interval_minutes": 60,
+        },
         "log_level": "INFO",
         "proxy": {
             "enabled": False,
             "host": "127.0.0.1",
             "port": 7890,
         },
+        "short_link_cache": {
+            "ttl_hours": 168,
+            "max_size": 10000,
+        },
+        "http": {
+            "timeout": 30,
+            "max_connections": 100,
+            "connections_per_host": 6,
+            "http2": True,
+            "use_proxy": False,
+        },
         "douyin": {
             "cookie": "",
         },
         "bilibili": {
             "cookie": "",
+            "connections_per_host": 4,
+            "segment_size_mb": 8,
         },
         "send_file": False,
+        "progress_interval": 3,
+        "download_queue": {
+            "max_size": 20,
+            "workers": {
+                "youtube": 1,
+                "douyin": 2,
+                "bilibili": 2,
+                "telegram": 3,
+            },
+        },
+        "telegram_download": {
+            "parallel_threshold_mb": 20,
+            "connections": 4,
+            "part_size_kb": 512,
+        },
+        "telegram_upload": {
+            "parallel_threshold_mb": 20,
+            "connections": 4,
+            "part_size_kb": 512,
+        },
+        "rate_limit": {
+            "max_flood_wait": 300,
+            "max_retries": 3,
+        },
+        "metrics": {
+            "enabled": False,
+            "host": "127.0.0.1",
+            "port": 9464,
+            "loop_lag_interval": 1,
+        },
         "youtube_audio_convert": {
             "enabled": False,
             "format": "mp3",
@@ -1,21 +1,64 @@
 import os
 import re
+import time
 import asyncio
 import logging
+import contextlib
+import httpx
 from datetime import datetime
+from urllib.parse import urlsplit
 from bilibili_api import video, Credential
 from bilibili_api.exceptions import NetworkException, ResponseCodeException
 from ..constants import BILIBILI_TEMP_DIR, BILIBILI_DEST_DIR
+from ..services.http_client import HttpClientService
+from ..services.short_link_resolver import get_short_link_resolver
+from ..services.download_index import get_download_index
+from ..utils.storage import staging_dir, publish
+from ..services.metrics import FFMPEG_SECONDS, record_download
 
 logger = logging.getLogger(__name__)
 
+# 每次写入磁盘前在内存中累积的字节数
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 单个分段下载失败后的重试次数
+SEGMENT_RETRIES = 2
+# 可以直接封装进 MP4 的音频编码（DASH codecs 字段前缀）
+MP4_AUDIO_CODECS = ("mp4a", "ec-3", "ac-3")
+
+
+def _write_all(fd, data):
+    """阻塞写入全部数据（在线程中调用）"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
 
 class BilibiliHandler:
-    def __init__(self, config):
-        """初始化B站处理器"""
+    def __init__(self, config, http_client=None, short_links=None, download_index=None):
+        """初始化B站处理器
+
+        Args:
+            config: bilibili 配置
+            http_client: 共享的 HttpClientService，为空时创建一个新的
+            short_links: 短链接解析缓存，为空时使用全局共享的缓存
+            download_index: 下载索引，为空时使用全局共享的索引
+        """
         self.config = config
+        self.http = http_client or HttpClientService()
+        self.short_links = (
+            short_links if short_links is not None else get_short_link_resolver()
+        )
+        self.download_index = (
+            download_index if download_index is not None else get_download_index()
+        )
         self.credential = None
         self.cookie = config.get("cookie")
+        # B站CDN对单个连接限速，同一主机最多同时使用的连接数
+        self.connections_per_host = max(1, config.get("connections_per_host", 4))
+        # 超过该大小的流按 HTTP Range 拆成多段并行下载
+        self.segment_size = config.get("segment_size_mb", 8) * 1024 * 1024
+        # 边下载边合并时需要同时占用两路连接，串行获取以免互相等待
+        self._pipe_lock = asyncio.Lock()
 
         # 如果配置了完整的cookie字符串，尝试从中提取凭证
         if self.cookie:
@@ -25,7 +68,7 @@ class BilibiliHandler:
         os.makedirs(BILIBILI_TEMP_DIR, exist_ok=True)
         os.makedirs(BILIBILI_DEST_DIR, exist_ok=True)
 
-    def extract_bvid(self, url):
+    async def extract_bvid(self, url):
         """从URL中提取BV号"""
         # 匹配BV号
         bv_pattern = r"BV\w{10}"
@@ -33,23 +76,39 @@ class BilibiliHandler:
         if match:
             return match.group(0)
 
-        # 匹配短链接
+        # 匹配短链接（结果会被缓存，同一链接的并发解析只请求一次）
         if "b23.tv" in url:
-            try:
-                import httpx
-
-                response = httpx.head(url, follow_redirects=True)
-                return self.extract_bvid(str(response.url))
-            except Exception as e:
-                logger.error(f"解析短链接失败: {str(e)}")
+            return await self.short_links.resolve(url, self._resolve_short_link)
 
         return None
 
-    async def download_video(self, url):
-        """下载B站视频"""
+    async def _resolve_short_link(self, url):
+        """跟随短链接的重定向并提取BV号"""
+        try:
+            final_url = await self.http.resolve_redirect(url)
+        except Exception as e:
+            logger.error(f"解析短链接失败: {str(e)}")
+            return None
+        match = re.search(r"BV\w{10}", final_url)
+        return match.group(0) if match else None
+
+    async def find_downloaded(self, url):
+        """查找该链接对应的视频是否已经下载过，返回文件路径或None"""
+        bvid = await self.extract_bvid(url)
+        return self.download_index.get("bilibili", bvid)
+
+    async def download_video(self, url, progress=None):
+        """下载B站视频
+
+        Args:
+            url: 视频链接
+            progress: 可选的 ProgressReporter，用于汇报下载进度
+        """
+        start = time.perf_counter()
+        size = None
         try:
             # 提取BV号
-            bvid = self.extract_bvid(url)
+            bvid = await self.extract_bvid(url)
             if not bvid:
                 raise ValueError("无法从URL中提取BV号")
 
@@ -61,9 +120,14 @@ class BilibiliHandler:
             title = info["title"]
             owner = info["owner"]["name"]
 
-            # 生成安全的文件名
-            safe_title = re.sub(r'[\\/:*?"<>|]', "_", title)
-            filename = f"{safe_title}"
+            # 目前只下载第一个分P
+            page_index = 0
+
+            # 生成安全的文件名，与YouTube一样带上视频ID，同名视频不会互相覆盖
+            safe_title = re.sub(r'[\\/:*?"<>|]', "_", title)[:100]
+            filename = f"{safe_title}-{bvid}"
+            if len(info.get("pages") or ()) > 1:
+                filename += f"_p{page_index + 1}"
 
             # 下载视频
             logger.info(f"开始下载视频: {title}")
@@ -72,25 +136,35 @@ class BilibiliHandler:
             final_path = os.path.join(BILIBILI_DEST_DIR, f"{filename}.mp4")
 
             # 获取视频流
-            video_url = await v.get_download_url(0)
-
-            # 下载视频和音频
-            await self._download_stream(
-                video_url["dash"]["video"][0]["baseUrl"], temp_video_path
-            )
-            await self._download_stream(
-                video_url["dash"]["audio"][0]["baseUrl"], temp_audio_path
+            dash = (await v.get_download_url(page_index))["dash"]
+            video_stream = dash["video"][0]
+            audio_stream = dash["audio"][0]
+            streams = [
+                (video_stream["baseUrl"], temp_video_path, "视频"),
+                (audio_stream["baseUrl"], temp_audio_path, "音频"),
+            ]
+            # DASH 音频通常已经是 AAC，可以直接封装进 MP4，其他编码才需要转码
+            transcode = not audio_stream.get("codecs", "mp4a").startswith(
+                MP4_AUDIO_CODECS
             )
-            if os.path.exists(final_path):
-                os.remove(final_path)
-            # 合并视频和音频
-            await self._merge_video_audio(temp_video_path, temp_audio_path, final_path)
 
-            # 清理临时文件
-            if os.path.exists(temp_video_path):
-                os.remove(temp_video_path)
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
+            # 合并输出写到与保存目录同一文件系统的暂存目录，完成后原子地发布
+            staged_path = os.path.join(
+                staging_dir(BILIBILI_DEST_DIR, BILIBILI_TEMP_DIR), f"{filename}.mp4"
+            )
+            try:
+                await self._download_and_merge(
+                    streams, staged_path, progress, transcode
+                )
+            finally:
+                # 清理临时文件
+                for _, path, _ in streams:
+                    if os.path.exists(path):
+                        os.remove(path)
+            await publish(staged_path, final_path, progress)
+            size = os.path.getsize(final_path)
+
+            self.download_index.put("bilibili", bvid, final_path)
 
             return {
                 "type": "video",
@@ -106,11 +180,12 @@ class BilibiliHandler:
         except Exception as e:
             logger.error(f"下载B站视频失败: {str(e)}")
             raise Exception(f"下载B站视频失败: {str(e)}")
+        finally:
+            record_download(
+                "bilibili", time.perf_counter() - start, size, size is not None
+            )
 
-    async def _download_stream(self, url, path):
-        """下载流媒体"""
-        import httpx
-
+    def _headers(self):
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Referer": "https://www.bilibili.com",
@@ -120,48 +195,308 @@ class BilibiliHandler:
             headers["Cookie"] = (
                 f"SESSDATA={self.credential.sessdata}; bili_jct={self.credential.bili_jct}; buvid3={self.credential.buvid3}"
             )
-
-        async with httpx.AsyncClient() as client:
-            async with client.stream("GET", url, headers=headers) as response:
+        return headers
+
+    def _stream(self, url, headers=None):
+        """通过共享客户端发起请求，同一CDN主机的连接数受 connections_per_host 限制"""
+        return self.http.stream(
+            "GET",
+            url,
+            limit=self.connections_per_host,
+            headers={**self._headers(), **(headers or {})},
+        )
+
+    async def _probe_size(self, url):
+        """请求第一个字节，服务器支持 Range 时返回文件总大小，否则返回None"""
+        async with self._stream(url, {"Range": "bytes=0-0"}) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code != 206 or "/" not in content_range:
+                return None
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+
+    async def _segment_total(self, url):
+        """流需要按 Range 分段下载时返回其总大小，单连接下载时返回None"""
+        if self.connections_per_host <= 1:
+            return None
+        try:
+            total = await self._probe_size(url)
+        except httpx.HTTPError as e:
+            logger.debug(f"获取文件大小失败，改用单连接下载: {str(e)}")
+            return None
+        return total if total and total > self.segment_size else None
+
+    def _can_pipe(self, streams):
+        """管道合并需要同时保持两路连接：同一主机上的流数不能超过 connections_per_host，
+        否则第二路会一直等待第一路占用的连接"""
+        hosts = [urlsplit(url).hostname for url, _, _ in streams]
+        return all(hosts.count(host) <= self.connections_per_host for host in hosts)
+
+    @staticmethod
+    def _progress_callback(progress, label, total=None):
+        """返回累计已下载字节数并汇报进度的回调"""
+        downloaded = 0
+
+        def on_data(size):
+            nonlocal downloaded
+            downloaded += size
+            if progress:
+                progress.report(downloaded, total, label)
+
+        return on_data
+
+    async def _download_stream(self, url, path, progress=None, label="", total=None):
+        """下载流媒体到文件，total 不为空时按 Range 分段并行写入预分配的文件"""
+        if not total:
+            async with self._stream(url) as response:
                 response.raise_for_status()
-
+                on_data = self._progress_callback(
+                    progress,
+                    label,
+                    int(response.headers.get("Content-Length", 0)) or None,
+                )
                 with open(path, "wb") as f:
                     async for chunk in response.aiter_bytes():
                         f.write(chunk)
-
-    async def _merge_video_audio(self, video_path, audio_path, output_path):
-        """合并视频和音频"""
-        try:
-            import subprocess
-
-            cmd = [
-                "ffmpeg",
-                "-i",
-                video_path,
-                "-i",
-                audio_path,
-                "-c:v",
-                "copy",
-                "-c:a",
-                "aac",
-                "-strict",
-                "experimental",
-                output_path,
-            ]
-
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                        on_data(len(chunk))
+        else:
+            on_data = self._progress_callback(progress, label, total)
+            segment_count = min(
+                self.connections_per_host, -(-total // self.segment_size)
+            )
+            segment_size = -(-total // segment_count)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.ftruncate(fd, total)
+                await asyncio.gather(
+                    *(
+                        self._download_segment(
+                            url,
+                            fd,
+                            start,
+                            min(start + segment_size, total) - 1,
+                            on_data,
+                        )
+                        for start in range(0, total, segment_size)
+                    )
+                )
+            finally:
+                os.close(fd)
+            logger.info(
+                f"{label}分 {segment_count} 段下载完成: {os.path.basename(path)}"
             )
 
-            stdout, stderr = await process.communicate()
-
-            if process.returncode != 0:
-                logger.error(f"合并视频失败: {stderr.decode()}")
-                raise Exception("合并视频失败")
+        if progress:
+            progress.done(label)
 
-        except Exception as e:
-            logger.error(f"合并视频和音频失败: {str(e)}")
-            raise Exception(f"合并视频和音频失败: {str(e)}")
+    async def _download_segment(self, url, fd, start, end, on_data):
+        """下载 [start, end] 字节区间并写入文件对应位置，中断后从已下载位置续传"""
+        offset = start
+        for attempt in range(SEGMENT_RETRIES + 1):
+            try:
+                async with self._stream(
+                    url, {"Range": f"bytes={offset}-{end}"}
+                ) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise httpx.HTTPError("服务器不支持分段下载")
+                    buffer = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        buffer += chunk
+                        if len(buffer) >= WRITE_BUFFER_SIZE:
+                            await asyncio.to_thread(os.pwrite, fd, buffer, offset)
+                            offset += len(buffer)
+                            on_data(len(buffer))
+                            buffer = bytearray()
+                    if buffer:
+                        await asyncio.to_thread(os.pwrite, fd, buffer, offset)
+                        offset += len(buffer)
+                        on_data(len(buffer))
+                if offset > end:
+                    return
+                raise httpx.HTTPError(f"分段数据不完整: {offset}/{end + 1}")
+            except httpx.HTTPError as e:
+                if attempt >= SEGMENT_RETRIES:
+                    raise
+                logger.warning(f"分段 {start}-{end} 下载失败，正在重试: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _download_and_merge(
+        self, streams, output_path, progress=None, transcode=False
+    ):
+        """下载视频流和音频流并合并为 MP4
+
+        分段并行下载的数据是乱序写入的，只能先落盘再合并；B站的视频流通常大于
+        segment_size_mb，因此多数情况下走临时文件合并。管道合并只用于两路流都
+        不超过 segment_size_mb（或服务器不支持 Range、connections_per_host 为1）
+        的短视频：同一主机上的流数不超过 connections_per_host 时，边下载边交给
+        ffmpeg 封装，不写临时文件。
+        管道合并失败时改为下载到临时文件后合并，直接复制流失败时再转码音频。
+
+        Args:
+            streams: [(url, 临时文件路径, 进度标签), ...]，依次为视频流和音频流
+            output_path: 输出文件路径
+            progress: 可选的 ProgressReporter
+            transcode: 音频编码无法直接封装进 MP4 时为True
+        """
+        totals = await asyncio.gather(
+            *(self._segment_total(url) for url, _, _ in streams)
+        )
+
+        success = False
+        if not any(totals) and self._can_pipe(streams):
+            if progress:
+                progress.set_status("正在下载并合并视频和音频...")
+            success, error = await self._pipe_merge(
+                streams, output_path, progress, transcode
+            )
+            if not success:
+                logger.warning(f"通过管道合并失败，改为下载到临时文件后合并: {error}")
+
+        if not success:
+            await asyncio.gather(
+                *(
+                    self._download_stream(url, path, progress, label, total)
+                    for (url, path, label), total in zip(streams, totals)
+                )
+            )
+            if progress:
+                progress.set_status("下载完成，正在合并视频和音频...")
+            paths = [path for _, path, _ in streams]
+            success, error = await self._merge_video_audio(
+                paths, output_path, transcode
+            )
+            if not success and not transcode:
+                logger.warning(f"直接复制流合并失败，改为转码音频: {error}")
+                success, error = await self._merge_video_audio(
+                    paths, output_path, transcode=True
+                )
+
+        if not success:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise Exception(f"合并视频和音频失败: {error}")
+
+    @staticmethod
+    def _merge_command(inputs, output_path, transcode=False):
+        """生成合并命令：默认直接复制两路流，transcode 为True时把音频转码为 AAC"""
+        cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+        for source in inputs:
+            cmd += ["-i", source]
+        cmd += ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy"]
+        if transcode:
+            cmd += ["-c:a", "aac"]
+        # 把 moov 移到文件开头，发送到 Telegram 后可以边下边播
+        cmd += ["-movflags", "+faststart", output_path]
+        return cmd
+
+    async def _merge_video_audio(self, paths, output_path, transcode=False):
+        """合并已下载的视频和音频文件
+
+        Returns:
+            (success, error)
+        """
+        try:
+            with FFMPEG_SECONDS.time(
+                platform="bilibili", operation="transcode" if transcode else "copy"
+            ):
+                process = await asyncio.create_subprocess_exec(
+                    *self._merge_command(paths, output_path, transcode),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                _, stderr = await process.communicate()
+        except OSError as e:
+            return False, str(e)
+        if process.returncode != 0:
+            return False, stderr.decode(errors="replace").strip()
+        return True, None
+
+    async def _pipe_merge(self, streams, output_path, progress=None, transcode=False):
+        """边下载边合并：每路流写入一个管道，ffmpeg 以 pipe:<fd> 读取
+
+        Returns:
+            (success, error)
+        """
+        pipes = [os.pipe() for _ in streams]
+        open_fds = {fd for pipe in pipes for fd in pipe}
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                # ffmpeg 读取一路流时另一路会因管道写满而阻塞并一直占用连接，
+                # 因此先同时拿到两路连接再启动 ffmpeg，避免多个合并任务互相等待连接
+                async with self._pipe_lock:
+                    responses = [
+                        await stack.enter_async_context(self._stream(url))
+                        for url, _, _ in streams
+                    ]
+                for response in responses:
+                    response.raise_for_status()
+
+                read_fds = [read_fd for read_fd, _ in pipes]
+                process = await asyncio.create_subprocess_exec(
+                    *self._merge_command(
+                        [f"pipe:{fd}" for fd in read_fds], output_path, transcode
+                    ),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                    pass_fds=read_fds,
+                )
+                for fd in read_fds:
+                    os.close(fd)
+                    open_fds.discard(fd)
+
+                feeders = []
+                for response, (_, write_fd), (_, _, label) in zip(
+                    responses, pipes, streams
+                ):
+                    open_fds.discard(write_fd)
+                    on_data = self._progress_callback(
+                        progress,
+                        label,
+                        int(response.headers.get("Content-Length", 0)) or None,
+                    )
+                    feeders.append(self._feed_pipe(response, write_fd, on_data))
+                # 边下载边合并，耗时包含下载时间
+                with FFMPEG_SECONDS.time(platform="bilibili", operation="pipe"):
+                    results = await asyncio.gather(
+                        process.communicate(), *feeders, return_exceptions=True
+                    )
+        except (httpx.HTTPError, OSError) as e:
+            return False, str(e)
+        finally:
+            for fd in open_fds:
+                os.close(fd)
+
+        # 任意一路下载中断时 ffmpeg 可能只读到部分数据，不能以返回码判断
+        errors = [
+            str(result) for result in results if isinstance(result, BaseException)
+        ]
+        if errors:
+            return False, "; ".join(errors)
+        if process.returncode != 0:
+            return False, results[0][1].decode(errors="replace").strip()
+        if progress:
+            for _, _, label in streams:
+                progress.done(label)
+        return True, None
+
+    async def _feed_pipe(self, response, fd, on_data):
+        """把响应内容写入管道，写完后关闭写端让 ffmpeg 读到 EOF"""
+        try:
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(_write_all, fd, buffer)
+                    on_data(len(buffer))
+                    buffer = bytearray()
+            if buffer:
+                await asyncio.to_thread(_write_all, fd, buffer)
+                on_data(len(buffer))
+        finally:
+            os.close(fd)
 
     def parse_cookie(self, cookie_str):
         """解析B站Cookie字符串，提取关键凭证信息"""
@@ -1,38 +1,54 @@
 import logging
 import asyncio
-import os
 from datetime import datetime, timezone, timedelta
-from telethon import TelegramClient
-from telethon.tl.functions.messages import GetHistoryRequest
+from telethon import TelegramClient, utils, errors
 from telethon.tl.types import Channel, MessageEntityTextUrl
-from telethon.errors import FloodWaitError
+from ..utils.telegram_utils import send_media_copy
+from ..services.rate_limiter import RateLimiter
+from ..services.metrics import CHANNEL_TRANSFER_SECONDS, CHANNEL_TRANSFER_MESSAGES
 
 logger = logging.getLogger(__name__)
 
 # 定义上海时区（UTC+8）
 SHANGHAI_TIMEZONE = timezone(timedelta(hours=8))
 
+# forward_messages 单次请求最多转发的消息数
+FORWARD_BATCH_SIZE = 100
+# 临时性错误：停止本次转发，下次运行时从断点重试；其他错误只跳过出错的消息
+TRANSIENT_ERRORS = (
+    errors.FloodError,
+    errors.SlowModeWaitError,
+    errors.ServerError,
+    errors.RpcCallFailError,
+    errors.TimedOutError,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+def _is_service_message(message):
+    """服务消息（置顶、入群、改名等）无法转发或重新发送"""
+    return getattr(message, "action", None) is not None
+
 
 class ChannelTransferHandler:
     """处理频道消息转发的类"""
 
-    def __init__(self, client: TelegramClient):
+    def __init__(
+        self, client: TelegramClient, checkpoint_store=None, rate_limiter=None
+    ):
         """
         初始化频道转发处理器
 
         Args:
             client: Telegram客户端实例
+            checkpoint_store: 转发断点存储（TransferCheckpointStore），为空时不记录断点
+            rate_limiter: 请求限速器，为空且客户端尚未安装限速器时创建一个新的
         """
         self.client = client
-        # 创建临时目录
-        self.temp_dir = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "temp",
-        )
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
+        # 转发请求的间隔与FloodWait重试都由限速器负责，客户端已安装限速器时沿用
+        self.rate_limiter = (rate_limiter or RateLimiter()).install(client)
+        self.checkpoint_store = checkpoint_store
 
     async def get_entity(self, channel_id_or_username):
         """获取频道实体"""
@@ -42,8 +58,176 @@ class ChannelTransferHandler:
             logger.error(f"获取频道实体失败: {str(e)}")
             return None
 
+    def _iter_history(self, source_entity, since_date, min_id=0):
+        """按时间正序迭代源频道中晚于起始时间（或ID大于min_id）的消息
+
+        过滤由服务端完成（offset_date/min_id），Telethon 按页拉取后逐条产出。
+        """
+        # 与原先的比较方式保持一致：消息时间戳 + 8小时 >= 起始时间戳
+        offset_date = datetime.fromtimestamp(
+            since_date.timestamp() - 8 * 3600, tz=timezone.utc
+        )
+        logger.info(
+            f"从 {offset_date.astimezone(SHANGHAI_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')} 开始扫描历史消息"
+            + (f"（ID > {min_id}）" if min_id else "")
+        )
+        return self.client.iter_messages(
+            source_entity, reverse=True, offset_date=offset_date, min_id=min_id
+        )
+
+    @staticmethod
+    async def _chunk_messages(messages, size):
+        """按顺序把消息流分批，同一相册（grouped_id）的消息不会被拆到两批中"""
+        chunk = []
+        async for message in messages:
+            grouped_id = getattr(message, "grouped_id", None)
+            if len(chunk) >= size:
+                # 当前批次已满，把末尾与下一条同属一个相册的消息移到下一批
+                carry = []
+                while (
+                    grouped_id
+                    and chunk
+                    and getattr(chunk[-1], "grouped_id", None) == grouped_id
+                ):
+                    carry.insert(0, chunk.pop())
+                if chunk:
+                    yield chunk
+                chunk = carry
+            chunk.append(message)
+        if chunk:
+            yield chunk
+
+    async def _send_message_copy(self, message, target_entity):
+        """重新发送消息内容（保留格式和链接）
+
+        Returns:
+            是否发送了消息；服务消息和没有文本也没有照片的消息会被跳过
+        """
+        if _is_service_message(message):
+            return False
+        # 提取消息文本和实体（保留格式化和链接）
+        text = message.message or ""
+        entities = list(message.entities or [])
+        if not text and not getattr(message, "photo", None):
+            return False
+
+        # 检查是否有链接实体，输出调试信息
+        url = ""
+        for entity in entities:
+            if isinstance(entity, MessageEntityTextUrl):
+                url = entity.url
+                text += f"\n{url}"
+                if "115" in url:
+                    logger.info(f"发现链接:  {url}")
+                    break
+
+        # 如果发现了链接，检查消息文本中是否有"点击转存"字样，将其替换为Markdown链接形式
+        if url and "点击转存" in text:
+            # 替换"点击转存"为Markdown格式的链接
+            text = text.replace("点击转存", f"[点击转存]({url})")
+
+            # 移除之前在文本末尾添加的链接
+            if text.endswith(url) or text.endswith(f"\n{url}"):
+                text = text[: -(len(url) + (1 if text.endswith(f"\n{url}") else 0))]
+
+            logger.info(f"已将'点击转存'转换为Markdown链接形式: {url}")
+
+            # 设置parse_mode为Markdown，清除entities避免冲突
+            entities = None
+
+        # 检查消息是否包含photo
+        if hasattr(message, "photo") and message.photo:
+            # 直接复用原消息的照片引用发送带格式的文本和照片，
+            # 受保护的聊天会退回到下载到内存后再发送
+            await send_media_copy(
+                self.client,
+                lambda files: self.client.send_message(
+                    target_entity,
+                    text,
+                    file=files[0],
+                    formatting_entities=None if entities is None else entities,
+                    parse_mode="md" if entities is None else None,
+                ),
+                [message],
+            )
+            logger.info("已转发图文消息（保留格式）")
+        else:
+            # 发送带格式的纯文本
+            await self.client.send_message(
+                target_entity,
+                text,
+                formatting_entities=None if entities is None else entities,
+                parse_mode="md" if entities is None else None,
+            )
+            logger.info(f"已转发文本消息（保留格式）: {text[:30]}...")
+        return True
+
+    async def _save_checkpoint(self, checkpoint_key, message_id):
+        if not self.checkpoint_store:
+            return
+        try:
+            await self.checkpoint_store.set(*checkpoint_key, message_id)
+        except Exception as e:
+            logger.error(f"保存转发断点失败: {str(e)}")
+
+    async def _forward_chunk(self, chunk, source_entity, target_entity, checkpoint_key):
+        """直接转发一批消息，整批失败时逐条重试，跳过无法转发的消息
+
+        Returns:
+            (成功转发的消息数, 是否因临时错误停止)
+        """
+        messages = [message for message in chunk if not _is_service_message(message)]
+        skipped = len(chunk) - len(messages)
+        if skipped:
+            CHANNEL_TRANSFER_MESSAGES.inc(skipped, mode="forward", status="skipped")
+        try:
+            if messages:
+                with CHANNEL_TRANSFER_SECONDS.time(mode="forward"):
+                    await self.client.forward_messages(
+                        target_entity,
+                        [message.id for message in messages],
+                        from_peer=source_entity,
+                    )
+                CHANNEL_TRANSFER_MESSAGES.inc(
+                    len(messages), mode="forward", status="success"
+                )
+                logger.info(f"已直接转发 {len(messages)} 条消息")
+            await self._save_checkpoint(checkpoint_key, chunk[-1].id)
+            return len(messages), False
+        except TRANSIENT_ERRORS as e:
+            CHANNEL_TRANSFER_MESSAGES.inc(len(messages), mode="forward", status="error")
+            logger.warning(
+                f"批量转发时出现临时错误，停止本次转发，消息 {chunk[0].id} 起下次重试: {str(e)}"
+            )
+            return 0, True
+        except Exception as e:
+            logger.warning(f"批量转发消息失败，改为逐条转发: {str(e)}")
+
+        forwarded_count = 0
+        for message in messages:
+            try:
+                with CHANNEL_TRANSFER_SECONDS.time(mode="forward"):
+                    await self.client.forward_messages(
+                        target_entity, [message.id], from_peer=source_entity
+                    )
+                CHANNEL_TRANSFER_MESSAGES.inc(mode="forward", status="success")
+                forwarded_count += 1
+            except TRANSIENT_ERRORS as e:
+                CHANNEL_TRANSFER_MESSAGES.inc(mode="forward", status="error")
+                logger.warning(
+                    f"转发消息 {message.id} 时出现临时错误，停止本次转发，下次重试: {str(e)}"
+                )
+                return forwarded_count, True
+            except Exception as e:
+                CHANNEL_TRANSFER_MESSAGES.inc(mode="forward", status="error")
+                logger.error(f"转发消息 {message.id} 失败，已跳过: {str(e)}")
+            await self._save_checkpoint(checkpoint_key, message.id)
+        # 批次末尾的服务消息也已处理完
+        await self._save_checkpoint(checkpoint_key, chunk[-1].id)
+        return forwarded_count, False
+
     async def transfer_messages(
-        self, source_channel, target_channel, since_date, direct=False
+        self, source_channel, target_channel, since_date, direct=False, min_id=0
     ):
         """
         转发指定日期后的消息
@@ -52,6 +236,8 @@ class ChannelTransferHandler:
             source_channel: 源频道ID/用户名/实体对象
             target_channel: 目标频道ID/用户名/实体对象
             since_date: 日期时间对象，只转发该时间之后的消息
+            direct: 是否直接转发（否则重新发送消息内容）
+            min_id: 只转发ID大于该值的消息；配置了断点存储时取两者中较大的值
 
         Returns:
             成功转发的消息数量
@@ -72,154 +258,54 @@ class ChannelTransferHandler:
                 logger.error("未能获取源频道或目标频道实体")
                 return 0
 
-            # 将日期转换为时间戳（秒）
-            since_timestamp = since_date.timestamp()
-            logger.info(
-                f"使用时间戳作为起始时间: {since_timestamp} ({since_date.strftime('%Y-%m-%d %H:%M:%S')})"
+            # 从断点继续，只拉取上次之后的新消息
+            checkpoint_key = (
+                utils.get_peer_id(source_entity),
+                utils.get_peer_id(target_entity),
             )
-
-            # 获取频道消息历史
-            messages = []
-            offset_id = 0
-            limit = 100
-            total_messages = 0
-
-            while True:
-                history = await self.client(
-                    GetHistoryRequest(
-                        peer=source_entity,
-                        offset_id=offset_id,
-                        offset_date=None,
-                        add_offset=0,
-                        limit=limit,
-                        max_id=0,
-                        min_id=0,
-                        hash=0,
+            if self.checkpoint_store:
+                checkpoint = await self.checkpoint_store.get(*checkpoint_key)
+                if checkpoint > min_id:
+                    logger.info(f"从断点继续转发：消息ID > {checkpoint}")
+                    min_id = checkpoint
+
+            # 由服务端按日期/ID过滤，从最旧的消息开始边拉取边转发，不在内存中堆积
+            messages = self._iter_history(source_entity, since_date, min_id)
+            if direct:
+                # 直接转发：每次请求按顺序转发一批消息
+                forwarded_count = 0
+                async for chunk in self._chunk_messages(messages, FORWARD_BATCH_SIZE):
+                    count, stopped = await self._forward_chunk(
+                        chunk, source_entity, target_entity, checkpoint_key
                     )
-                )
-
-                if not history.messages:
-                    break
-
-                # 更新offset以获取下一批消息
-                offset_id = history.messages[-1].id
-                total_count = len(history.messages)
-                total_messages += total_count
-                now_message_count = 0
-
-                # 过滤消息
-                for message in history.messages:
-                    message_time_shanghai = message.date.astimezone(SHANGHAI_TIMEZONE)
-                    # 将消息日期转换为时间戳
-                    message_timestamp = message_time_shanghai.timestamp()
-
-                    # 使用时间戳直接比较
-                    if message_timestamp + 8 * 3600 >= since_timestamp:
-                        messages.append(message)
-                        now_message_count += 1
-                        logger.info(
-                            f"消息时间戳 {message_timestamp} ({message_time_shanghai.strftime('%Y-%m-%d %H:%M:%S')}) >= 起始时间戳 {since_timestamp} ({since_date.strftime('%Y-%m-%d %H:%M:%S')})，添加"
-                        )
-                    else:
-                        logger.info(
-                            f"消息时间戳 {message_timestamp} ({message_time_shanghai.strftime('%Y-%m-%d %H:%M:%S')}) < 起始时间戳 {since_timestamp} ({since_date.strftime('%Y-%m-%d %H:%M:%S')})，跳过"
-                        )
+                    forwarded_count += count
+                    if stopped:
                         break
+                return forwarded_count
 
-                if now_message_count < len(history.messages):
-                    logger.info(
-                        f"当前已收集符合条件的消息数：{now_message_count}条，跳过剩余消息"
-                    )
-                    break
-
-                # 避免触发速率限制
-                await asyncio.sleep(1)
-
-            message_count = len(messages)
-            logger.info(f"当前已收集符合条件的消息数：{message_count}条")
-
-            # 开始转发消息
             forwarded_count = 0
-            messages.reverse()
-            for message in messages:
+            async for message in messages:
                 try:
-                    if direct:
-                        await self.client.forward_messages(target_entity, message)
-                        logger.info("已直接转发消息")
-                        continue
-                    # 提取消息文本和实体（保留格式化和链接）
-                    text = message.message
-                    entities = message.entities
-
-                    # 检查是否有链接实体，输出调试信息
-                    url = ""
-                    for entity in entities:
-                        if isinstance(entity, MessageEntityTextUrl):
-                            url = entity.url
-                            text += f"\n{url}"
-                            if "115" in url:
-                                logger.info(f"发现链接:  {url}")
-                                break
-
-                    # 如果发现了链接，检查消息文本中是否有"点击转存"字样，将其替换为Markdown链接形式
-                    if url and "点击转存" in text:
-                        # 替换"点击转存"为Markdown格式的链接
-                        text = text.replace("点击转存", f"[点击转存]({url})")
-
-                        # 移除之前在文本末尾添加的链接
-                        if text.endswith(url) or text.endswith(f"\n{url}"):
-                            text = text[
-                                : -(len(url) + (1 if text.endswith(f"\n{url}") else 0))
-                            ]
-
-                        logger.info(f"已将'点击转存'转换为Markdown链接形式: {url}")
-
-                        # 设置parse_mode为Markdown，清除entities避免冲突
-                        entities = None
-
-                    # 检查消息是否包含photo
-                    if hasattr(message, "photo") and message.photo:
-                        # 下载照片到临时文件
-                        temp_file_path = os.path.join(
-                            self.temp_dir, f"photo_{message.id}.jpg"
-                        )
-                        await self.client.download_media(message.photo, temp_file_path)
-
-                        # 发送带格式的文本和照片
-                        await self.client.send_message(
-                            target_entity,
-                            text,
-                            file=temp_file_path,
-                            formatting_entities=None if entities is None else entities,
-                            parse_mode="md" if entities is None else None,
-                        )
-
-                        # 删除临时文件
-                        if os.path.exists(temp_file_path):
-                            os.remove(temp_file_path)
-
+                    with CHANNEL_TRANSFER_SECONDS.time(mode="copy"):
+                        sent = await self._send_message_copy(message, target_entity)
+                    if sent:
+                        CHANNEL_TRANSFER_MESSAGES.inc(mode="copy", status="success")
                         forwarded_count += 1
-                        logger.info("已转发图文消息（保留格式）")
                     else:
-                        # 发送带格式的纯文本
-                        await self.client.send_message(
-                            target_entity,
-                            text,
-                            formatting_entities=None if entities is None else entities,
-                            parse_mode="md" if entities is None else None,
-                        )
-                        forwarded_count += 1
-                        logger.info(f"已转发文本消息（保留格式）: {text[:30]}...")
-
-                    # 避免触发速率限制
-                    await asyncio.sleep(2)
-
-                except FloodWaitError as e:
-                    logger.warning(f"遇到速率限制，等待 {e.seconds} 秒")
-                    await asyncio.sleep(e.seconds)
-                    # 继续下一条消息
+                        CHANNEL_TRANSFER_MESSAGES.inc(mode="copy", status="skipped")
+                        logger.info(f"跳过服务消息或空消息: {message.id}")
+                except TRANSIENT_ERRORS as e:
+                    # 断点停在最后处理的消息，下次运行时从这条消息重试
+                    CHANNEL_TRANSFER_MESSAGES.inc(mode="copy", status="error")
+                    logger.warning(
+                        f"转发消息 {message.id} 时出现临时错误，停止本次转发，下次重试: {str(e)}"
+                    )
+                    break
                 except Exception as e:
-                    logger.error(f"转发消息时出错: {str(e)}")
+                    # 无法发送的消息直接跳过，避免一直卡在同一条消息上
+                    CHANNEL_TRANSFER_MESSAGES.inc(mode="copy", status="error")
+                    logger.error(f"转发消息 {message.id} 失败，已跳过: {str(e)}")
+                await self._save_checkpoint(checkpoint_key, message.id)
 
             return forwarded_count
 
@@ -268,11 +354,12 @@ class ChannelTransferHandler:
             )
             logger.info(f"成功转发 {count} 条消息")
 
-            # 更新since_date为当前时间，这样下次只会转发新消息
-            since_date = datetime.now()
-            logger.info(
-                f"更新起始时间为当前时间: {since_date.strftime('%Y-%m-%d %H:%M:%S')}"
-            )
+            if not self.checkpoint_store:
+                # 没有断点存储时，更新since_date为当前时间，这样下次只会转发新消息
+                since_date = datetime.now()
+                logger.info(
+                    f"更新起始时间为当前时间: {since_date.strftime('%Y-%m-%d %H:%M:%S')}"
+                )
 
             # 等待指定的小时数
             logger.info(f"等待 {interval_hours} 小时后继续执行")
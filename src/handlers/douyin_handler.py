@@ -1,18 +1,41 @@
 import os
+import re
+import time
 import shutil
 import logging
+import httpx
+from pathlib import Path
 from f2.apps.douyin.handler import DouyinHandler
 from src.constants import DOUYIN_DEST_DIR, DOUYIN_TEMP_DIR
-from f2.apps.douyin.utils import AwemeIdFetcher
+from src.services.http_client import HttpClientService
+from src.services.short_link_resolver import get_short_link_resolver
+from src.services.download_index import get_download_index
+from src.utils.storage import staging_dir, publish
+from src.services.metrics import record_download
+from f2.apps.douyin.utils import AwemeIdFetcher, format_file_name
 
 logger = logging.getLogger(__name__)
 
+# 分享链接重定向后的地址中的作品ID
+AWEME_ID_PATTERN = re.compile(r"/(?:video|note)/(\d+)|modal_id=(\d+)")
+
+
+async def _skip_save_last_aweme_id(sec_user_id, aweme_id):
+    """替代 f2 下载器的 save_last_aweme_id：单个作品下载不需要写 douyin_users.db"""
+
 
 class CustomDouyinHandler:
-    def __init__(self, cookie):
+    def __init__(self, cookie, http_client=None, short_links=None, download_index=None):
         self.cookie = cookie
-        self.download_path = DOUYIN_TEMP_DIR
-        os.makedirs(self.download_path, exist_ok=True)
+        self.http = http_client or HttpClientService()
+        self.short_links = (
+            short_links if short_links is not None else get_short_link_resolver()
+        )
+        self.download_index = (
+            download_index if download_index is not None else get_download_index()
+        )
+        # 下载到与保存目录同一文件系统的暂存目录，完成后直接 rename
+        self.download_path = staging_dir(DOUYIN_DEST_DIR, DOUYIN_TEMP_DIR)
 
     def get_download_config(self, url):
         """生成下载配置"""
@@ -29,20 +52,79 @@ class CustomDouyinHandler:
             "mode": "one",
         }
 
-    async def download_video(self, url):
-        """下载抖音视频"""
+    async def download_video(self, url, progress=None):
+        """下载抖音视频
+
+        只请求一次作品详情，并下载到以作品ID命名的临时目录，输出文件路径是确定的。
+
+        Args:
+            url: 分享链接
+            progress: 可选的 ProgressReporter，跨设备保存时汇报复制进度
+        """
+        start = time.perf_counter()
+        dest_path = None
         try:
             config = self.get_download_config(url)
-            video = await DouyinHandler(config).handle_one_video()
-            aweme_id = await AwemeIdFetcher.get_aweme_id(url)
-            video = await DouyinHandler(config).fetch_one_video(aweme_id)
-            return self.move_video(video._to_dict())
+            aweme_id = await self.get_aweme_id(url, config["headers"])
+            handler = DouyinHandler(config)
+            video = (await handler.fetch_one_video(aweme_id))._to_dict()
+
+            temp_dir = Path(self.download_path) / str(aweme_id)
+            # f2 每下载一个作品都会把 aweme_id 写入用户数据库，这里不需要
+            handler.downloader.save_last_aweme_id = _skip_save_last_aweme_id
+            await handler.downloader.create_download_tasks(config, video, temp_dir)
+            # 与 f2 下载器的命名规则一致：{naming}_video.mp4
+            video_path = (
+                temp_dir / f"{format_file_name(config['naming'], video)}_video.mp4"
+            )
+
+            video = await self.move_video(video, video_path, temp_dir, progress)
+            if video:
+                dest_path = video.get("dest_path")
+                self.download_index.put("douyin", aweme_id, dest_path)
+            return video
         except Exception as e:
             raise Exception(f"下载抖音视频失败: {str(e)}")
+        finally:
+            record_download(
+                "douyin",
+                time.perf_counter() - start,
+                os.path.getsize(dest_path) if dest_path else None,
+                dest_path is not None,
+            )
+
+    async def find_downloaded(self, url):
+        """查找该链接对应的视频是否已经下载过，返回文件路径或None"""
+        headers = self.get_download_config(url)["headers"]
+        return self.download_index.get("douyin", await self.get_aweme_id(url, headers))
+
+    async def get_aweme_id(self, url, headers=None):
+        """解析分享链接中的作品ID，结果会被缓存，同一链接的并发解析只请求一次"""
+        return await self.short_links.resolve(
+            url, lambda url: self._fetch_aweme_id(url, headers)
+        )
+
+    async def _fetch_aweme_id(self, url, headers=None):
+        """通过共享的HTTP客户端读取短链接的重定向地址，无法解析时再交给f2处理"""
+        try:
+            response = await self.http.request(
+                "GET", url, headers=headers, follow_redirects=False
+            )
+            location = response.headers.get("Location") or str(response.url)
+            match = AWEME_ID_PATTERN.search(location)
+            if match:
+                return match.group(1) or match.group(2)
+        except httpx.HTTPError as e:
+            logger.debug(f"解析抖音短链接失败: {str(e)}")
+        return await AwemeIdFetcher.get_aweme_id(url)
 
-    def move_video(self, video):
-        """移动视频"""
+    async def move_video(self, video, video_path, temp_dir, progress=None):
+        """把下载好的视频移动到保存目录，并清理临时目录"""
         try:
+            if not os.path.exists(video_path):
+                logger.error(f"未找到下载的视频文件: {video_path}")
+                return None
+
             desc = video.get("desc", "")
             create = video.get("create_time", "")
             nickname = video.get("nickname", "")
@@ -51,20 +133,11 @@ class CustomDouyinHandler:
                 if desc
                 else f"{create}_{nickname}.mp4"
             )
-            for root, dirs, files in os.walk(self.download_path):
-                for file in files:
-                    if nickname and nickname in file and create and create in file:
-                        shutil.move(
-                            os.path.join(root, file),
-                            os.path.join(DOUYIN_DEST_DIR, filename),
-                        )
-                        try:
-                            shutil.rmtree(root)
-                        except Exception as e:
-                            pass
-                        video["dest_path"] = os.path.join(DOUYIN_DEST_DIR, filename)
-                        return video
-            return None
+            dest_path = os.path.join(DOUYIN_DEST_DIR, filename)
+            await publish(video_path, dest_path, progress)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            video["dest_path"] = dest_path
+            return video
         except Exception as e:
             logger.error(f"移动视频失败: {str(e)}")
             return None
@@ -1,11 +1,26 @@
+import os
 import re
+import time
 import logging
-import os
-from telethon import events, errors
+from telethon import events, errors, utils
 from .telegram_handler import TelegramHandler
 from .youtube_handler import YouTubeHandler
 from .douyin_handler import CustomDouyinHandler
 from .bilibili_handler import BilibiliHandler
+from ..utils.transfer_rules import TransferRuleIndex
+from ..utils.progress import ProgressReporter
+from ..utils.telegram_utils import send_media_copy
+from ..utils.fast_transfer import (
+    upload_file_parallel,
+    PartTransferError,
+    BIG_FILE_SIZE,
+)
+from ..services.entity_index import get_entity_index
+from ..services.download_queue import DownloadQueue
+from ..services.http_client import HttpClientService
+from ..services.short_link_resolver import get_short_link_resolver
+from ..services.download_index import get_download_index
+from ..services.metrics import FORWARD_SECONDS, FORWARD_TOTAL, UPLOAD_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -13,28 +28,44 @@ logger = logging.getLogger(__name__)
 class EventHandler:
     def __init__(self, config):
         self.config = config
-        self.telegram_handler = TelegramHandler(config)
-        self.youtube_handler = YouTubeHandler(config)
+        # 各平台共用的HTTP连接池
+        self.http_client = HttpClientService(config)
+        # 短链接解析缓存（b23.tv、v.douyin.com）
+        self.short_links = get_short_link_resolver(config.get("short_link_cache"))
+        # 已下载内容索引，重复的请求直接返回已有文件
+        self.download_index = get_download_index()
+        self.telegram_handler = TelegramHandler(config, self.download_index)
+        self.youtube_handler = YouTubeHandler(config, self.download_index)
         self.douyin_handler = CustomDouyinHandler(
-            config.get("douyin", {}).get("cookie")
+            config.get("douyin", {}).get("cookie"),
+            self.http_client,
+            self.short_links,
+            self.download_index,
+        )
+        self.bilibili_handler = BilibiliHandler(
+            config.get("bilibili", {}),
+            self.http_client,
+            self.short_links,
+            self.download_index,
         )
-        self.bilibili_handler = BilibiliHandler(config.get("bilibili", {}))
         self.send_file = config.get("send_file", False)
+        upload_config = config.get("telegram_upload", {})
+        # 超过该大小的文件使用多连接并行上传（并行上传只支持大于10MB的文件）
+        self.upload_threshold = max(
+            BIG_FILE_SIZE + 1,
+            upload_config.get("parallel_threshold_mb", 20) * 1024 * 1024,
+        )
+        self.upload_connections = upload_config.get("connections", 4)
+        self.upload_part_size = upload_config.get("part_size_kb", 512) * 1024
+        # 状态消息两次编辑之间的最小间隔（秒）
+        self.progress_interval = config.get("progress_interval", 3)
+        # 下载任务队列，限制各平台的并发下载数
+        self.download_queue = DownloadQueue(config.get("download_queue"))
         self.transfer_config = config.get("transfer_message", [])
+        # 启动时编译转发规则索引
+        self.transfer_rules = TransferRuleIndex(self.transfer_config)
         # 允许使用视频转发功能的chat_id列表
         self.allowed_chat_ids = config.get("allowed_chat_ids", [])
-        # 缓存已获取的实体，避免重复查询
-        self.entity_cache = {}
-
-        # 创建临时目录
-        self.temp_dir = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "temp",
-        )
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
 
     def is_chat_allowed(self, chat_id):
         """检查chat_id是否在允许列表中"""
@@ -44,47 +75,18 @@ class EventHandler:
         # 检查chat_id是否在允许列表中（支持字符串和整数比较）
         return str(chat_id) in [str(allowed_id) for allowed_id in self.allowed_chat_ids]
 
+    def _entity_index(self, client):
+        """获取客户端对应的实体索引"""
+        return get_entity_index(client, self.config.get("entity_cache"))
+
     async def get_entity_safely(self, client, entity_id):
         """安全获取实体，处理各种可能的错误情况"""
-        # 先检查缓存
-        cache_key = str(entity_id)
-        if cache_key in self.entity_cache:
-            return self.entity_cache[cache_key]
-
         try:
-            # 如果是整数ID或以-100开头的字符串（频道/群组ID格式）
-            if isinstance(entity_id, int) or (
-                isinstance(entity_id, str)
-                and (entity_id.lstrip("-").isdigit() or entity_id.startswith("-100"))
-            ):
-                entity_id_int = int(entity_id)
-                # 遍历对话列表查找匹配的ID
-                async for dialog in client.iter_dialogs():
-                    if dialog.id == entity_id_int:
-                        logger.info(f"已找到频道/群组: {dialog.name} (ID: {dialog.id})")
-                        # 缓存实体
-                        self.entity_cache[cache_key] = dialog.entity
-                        return dialog.entity
-
-                # 如果遍历完所有对话后仍未找到
-                logger.error(f"未找到ID为 {entity_id} 的频道/群组")
-                return None
-            else:
-                # 对于用户名（@username格式），可以直接使用get_entity
-                entity = await client.get_entity(entity_id)
-                # 缓存实体
-                self.entity_cache[cache_key] = entity
-                return entity
-
+            # 先查实体索引，数字ID未命中时只遍历一次对话列表，失败结果会被负缓存
+            return await self._entity_index(client).resolve(client, entity_id)
         except errors.FloodWaitError as e:
             logger.error(f"请求过于频繁，需要等待 {e.seconds} 秒")
             return None
-        except errors.UsernameNotOccupiedError:
-            logger.error(f"用户名 {entity_id} 不存在")
-            return None
-        except ValueError as e:
-            logger.error(f"实体获取失败: {str(e)}")
-            return None
         except Exception as e:
             logger.error(f"获取实体时发生未知错误: {str(e)}")
             return None
@@ -97,147 +99,259 @@ class EventHandler:
                 (".mp3", ".m4a", ".ogg", ".wav", ".flac")
             )
 
-            if is_audio:
-                # 音频文件
-                await event.client.send_file(
-                    event.chat_id,
-                    file_path,
-                    force_document=False,
-                    attributes=[],  # 音频属性
+            status_message = await event.reply("正在上传文件...")
+            progress = ProgressReporter(status_message.edit, self.progress_interval)
+            start = time.perf_counter()
+            try:
+                progress_callback = progress.telethon_callback("上传")
+                input_file, parallel_error = await self._upload_parallel(
+                    event.client, file_path, progress_callback
                 )
-            else:
-                # 视频或其他文件
-                await event.client.send_file(
-                    event.chat_id,
-                    file_path,
-                    supports_streaming=True,
-                    force_document=False,
+                if parallel_error:
+                    progress.set_status(
+                        f"并行上传失败（{parallel_error}），改用普通上传..."
+                    )
+                if input_file:
+                    # 已上传的文件无法再从路径推断属性，这里按本地文件生成
+                    attributes, mime_type = utils.get_attributes(
+                        file_path, supports_streaming=not is_audio
+                    )
+                    await event.client.send_file(
+                        event.chat_id,
+                        input_file,
+                        attributes=attributes,
+                        mime_type=mime_type,
+                        supports_streaming=not is_audio,
+                        force_document=False,
+                    )
+                elif is_audio:
+                    # 音频文件
+                    await event.client.send_file(
+                        event.chat_id,
+                        file_path,
+                        force_document=False,
+                        attributes=[],  # 音频属性
+                        progress_callback=progress_callback,
+                    )
+                else:
+                    # 视频或其他文件
+                    await event.client.send_file(
+                        event.chat_id,
+                        file_path,
+                        supports_streaming=True,
+                        force_document=False,
+                        progress_callback=progress_callback,
+                    )
+                if input_file:
+                    mode = "parallel"
+                elif parallel_error:
+                    mode = "parallel_fallback"
+                else:
+                    mode = "send_file"
+                UPLOAD_SECONDS.observe(time.perf_counter() - start, mode=mode)
+                progress.close()
+                await status_message.delete()
+            except Exception as e:
+                progress.close()
+                logger.error(f"发送文件失败: {str(e)}")
+                await status_message.edit(f"❌ 发送文件失败: {str(e)}")
+
+    async def _upload_parallel(self, client, file_path, progress_callback=None):
+        """大文件通过多个连接并行上传
+
+        Returns:
+            (input_file, error)：文件较小时为 (None, None)；并行上传失败时为
+            (None, 失败原因)，由调用方改用 send_file 上传
+        """
+        if os.path.getsize(file_path) < self.upload_threshold:
+            return None, None
+        try:
+            input_file, _ = await upload_file_parallel(
+                client,
+                file_path,
+                part_size=self.upload_part_size,
+                connections=self.upload_connections,
+                progress_callback=progress_callback,
+            )
+            return input_file, None
+        except PartTransferError as e:
+            logger.warning(
+                f"并行上传失败，改用普通上传: {str(e)}，"
+                f"此前重试的分片: {e.part_retries or '无'}"
+            )
+            return None, f"分片 {e.index} 多次重试失败"
+        except Exception as e:
+            logger.warning(f"并行上传失败，改用普通上传: {str(e)}")
+            return None, str(e)
+
+    def _should_transfer(self, rule, hits, message_text):
+        """根据规则的排除词和包含词判断消息是否需要转发"""
+        # 首先检查排除词（优先级最高）
+        if rule.is_excluded(hits):
+            logger.info(f"消息包含排除词，跳过转发: {message_text[:50]}...")
+            return False
+
+        # 然后检查包含词，如果指定了关键词，至少匹配一个关键词才转发
+        return rule.is_included(hits)
+
+    async def _transfer_rules_for(self, event):
+        """查找消息所在聊天对应的转发规则（支持@用户名规则）"""
+        group_id = event.chat_id
+        # 先用chat_id查询规则索引，未命中的消息直接返回，无需请求网络
+        rules = self.transfer_rules.cached_rules_for(group_id)
+        if rules is None:
+            # 存在按用户名配置的规则且该聊天尚未解析过，获取一次聊天信息
+            chat = event.chat or await event.get_chat()
+            rules = self.transfer_rules.resolve(
+                group_id, getattr(chat, "username", None)
+            )
+        return rules
+
+    async def _copy_messages(self, client, target_entity, messages, message_text):
+        """重新发送消息内容（文本和照片）而不是转发原消息，相册在一次请求中发送
+
+        相册中的视频、文件等其他媒体无法直接复用，重新发送照片后原样转发。
+        """
+        photos = [message for message in messages if message.photo]
+        others = [
+            message for message in messages if message.media and not message.photo
+        ]
+        if photos and others:
+            # 其他媒体转发时自带说明文字，照片只带自己的说明文字，避免重复
+            photo_text = "\n".join(message.text for message in photos if message.text)
+            await self._copy_messages(client, target_entity, photos, photo_text)
+            await client.forward_messages(target_entity, others)
+            return
+        if not photos:
+            # 没有照片，只发送文本
+            await client.send_message(target_entity, message_text)
+            return
+
+        # 直接复用原消息中的照片（文件引用），无需下载再上传
+        if len(photos) == 1:
+
+            def send(files):
+                # 发送文本和照片
+                return client.send_message(target_entity, message_text, file=files[0])
+
+        else:
+            # 相册中每张照片保留各自的说明文字
+            captions = [message.text or "" for message in photos]
+            if not any(captions):
+                captions[0] = message_text
+
+            def send(files):
+                return client.send_file(target_entity, files, caption=captions)
+
+        await send_media_copy(client, send, photos)
+
+    async def _transfer(self, client, rules, messages, should_copy):
+        """按规则转发一条消息或一个相册
+
+        Args:
+            client: 发送消息的客户端
+            rules: 源聊天匹配的转发规则
+            messages: 要转发的消息列表（相册为多条）
+            should_copy: 函数，参数为规则，返回True表示重新发送内容而不是转发
+        """
+        message_text = "\n".join(message.text for message in messages if message.text)
+        # 一次扫描得到所有规则命中的关键词
+        hits = self.transfer_rules.scan(rules, message_text)
+
+        for rule in rules:
+            source_chat = rule.source_chat
+            target_chat = rule.target_chat
+            if not self._should_transfer(rule, hits, message_text):
+                continue
+
+            rule_label = f"{source_chat}->{target_chat}"
+            start = time.perf_counter()
+            try:
+                # 先获取目标频道/群组的实体
+                target_entity = await self.get_entity_safely(client, target_chat)
+                if not target_entity:
+                    logger.error(f"无法获取目标频道/群组实体: {target_chat}，跳过转发")
+                    FORWARD_TOTAL.inc(len(messages), rule=rule_label, status="error")
+                    continue
+
+                if should_copy(rule):
+                    logger.info(f"直接转发消息: {message_text}")
+                    mode = "copy"
+                    await self._copy_messages(
+                        client, target_entity, messages, message_text
+                    )
+                    logger.info(f"已将消息内容从 {source_chat} 发送到 {target_chat}")
+                else:
+                    # 转发消息，相册中的全部消息在一次请求中转发
+                    mode = "forward"
+                    await client.forward_messages(target_entity, messages)
+                    logger.info(
+                        f"已将 {len(messages)} 条消息从 {source_chat} 转发到 {target_chat}"
+                    )
+                FORWARD_SECONDS.observe(
+                    time.perf_counter() - start, rule=rule_label, mode=mode
                 )
+                FORWARD_TOTAL.inc(len(messages), rule=rule_label, status="success")
+            except Exception as e:
+                FORWARD_TOTAL.inc(len(messages), rule=rule_label, status="error")
+                logger.error(f"转发消息时出错: {str(e)}")
 
     def register_message_transfer(self, client):
         """注册消息转发处理程序（适用于用户客户端）"""
-        if not self.transfer_config:
+        if not self.transfer_rules:
             logger.info("未配置消息转发规则，跳过注册转发处理程序")
             return
 
-        logger.info(
-            f"正在注册消息转发处理程序，共有 {len(self.transfer_config)} 条规则"
-        )
+        logger.info(f"正在注册消息转发处理程序，共有 {len(self.transfer_rules)} 条规则")
+        # 从收到的更新中持续补充实体索引
+        self._entity_index(client).track(client)
 
         @client.on(events.NewMessage)
         async def handle_message_transfer(event):
             """处理来自任何聊天的新消息并进行转发"""
+            # 相册中的消息由 handle_album_transfer 统一处理
+            if event.message.grouped_id:
+                return
             try:
-                # 获取当前聊天的ID
-                chat = await event.get_chat()
-                group_id = event.chat_id
-                chat_username = getattr(chat, "username", None)
-
-                # 遍历转发配置
-                for transfer in self.transfer_config:
-                    source_chat = transfer.get("source_chat")
-
-                    # 检查是否匹配源聊天（通过ID或用户名）
-                    source_match = False
-                    if source_chat and (
-                        str(group_id) == str(source_chat)
-                        or (chat_username and f"@{chat_username}" == source_chat)
-                    ):
-                        source_match = True
-
-                    if source_match:
-                        target_chat = transfer.get("target_chat")
-                        include_keywords = transfer.get("include_keywords", [])
-                        exclude_words = transfer.get("exclude_words", [])
-                        direct = transfer.get("direct", False)
-                        # 检查是否需要根据关键词过滤
-                        should_transfer = True
-                        message_text = event.message.text if event.message.text else ""
-
-                        # 首先检查排除词（优先级最高）
-                        if exclude_words:
-                            if any(
-                                exclude_word in message_text
-                                for exclude_word in exclude_words
-                            ):
-                                should_transfer = False
-                                logger.info(
-                                    f"消息包含排除词，跳过转发: {message_text[:50]}..."
-                                )
-
-                        # 然后检查包含词
-                        if should_transfer and include_keywords:
-                            # 如果指定了关键词，至少匹配一个关键词才转发
-                            should_transfer = any(
-                                keyword in message_text for keyword in include_keywords
-                            )
-
-                        if should_transfer:
-                            try:
-                                # 先获取目标频道/群组的实体
-                                target_entity = await self.get_entity_safely(
-                                    client, target_chat
-                                )
-                                if not target_entity:
-                                    logger.error(
-                                        f"无法获取目标频道/群组实体: {target_chat}，跳过转发"
-                                    )
-                                    continue
-
-                                if direct:
-                                    logger.info(f"直接转发消息: {event.message.text}")
-                                    # 检查消息是否包含photo
-                                    if event.message.photo:
-                                        # 如果有照片，下载到临时文件再发送
-                                        temp_file_path = os.path.join(
-                                            self.temp_dir,
-                                            f"photo_{event.message.id}.jpg",
-                                        )
-                                        await event.message.download_media(
-                                            temp_file_path
-                                        )
-
-                                        # 发送文本和照片
-                                        await client.send_message(
-                                            target_entity,
-                                            (
-                                                event.message.text
-                                                if event.message.text
-                                                else ""
-                                            ),
-                                            file=temp_file_path,
-                                        )
-
-                                        # 删除临时文件
-                                        if os.path.exists(temp_file_path):
-                                            os.remove(temp_file_path)
-                                    else:
-                                        # 没有照片，只发送文本
-                                        await client.send_message(
-                                            target_entity, event.message.text
-                                        )
-                                else:
-                                    # 转发消息
-                                    await client.forward_messages(
-                                        target_entity, event.message
-                                    )
-                                    logger.info(
-                                        f"已将消息从 {source_chat} 转发到 {target_chat}"
-                                    )
-                            except Exception as e:
-                                logger.error(f"转发消息时出错: {str(e)}")
-
+                rules = await self._transfer_rules_for(event)
+                if rules:
+                    await self._transfer(
+                        client, rules, [event.message], lambda rule: rule.direct
+                    )
             except Exception as e:
                 logger.error(f"处理消息转发时出错: {str(e)}")
 
+        @client.on(events.Album)
+        async def handle_album_transfer(event):
+            """相册（共享grouped_id的多条消息）作为整体转发"""
+            try:
+                rules = await self._transfer_rules_for(event)
+                if rules:
+                    await self._transfer(
+                        client, rules, event.messages, lambda rule: rule.direct
+                    )
+            except Exception as e:
+                logger.error(f"处理相册转发时出错: {str(e)}")
+
     def register_handlers(self, client):
         """注册所有事件处理器"""
+        self._entity_index(client).track(client)
 
         @client.on(events.NewMessage(pattern="/start"))
         async def start(event):
             """处理 /start 命令"""
             await event.reply("你好！请转发视频给我，我会自动下载到指定文件夹。")
 
+        if self.transfer_rules:
+
+            @client.on(events.Album)
+            async def handle_album(event):
+                """处理相册转发"""
+                try:
+                    await self._handle_message_transfer(event, event.messages)
+                except Exception as e:
+                    logger.error(f"处理相册转发时出错: {str(e)}")
+
         @client.on(events.NewMessage)
         async def handle_message(event):
             """处理新消息"""
@@ -257,98 +371,105 @@ class EventHandler:
                     or "b23.tv" in event.message.text
                 )
                 if is_youtube:
-                    await self._handle_youtube_message(event)
+                    await self._enqueue_download(
+                        event, "youtube", self._handle_youtube_message
+                    )
                 elif is_douyin:
-                    await self._handle_douyin_message(event)
+                    await self._enqueue_download(
+                        event, "douyin", self._handle_douyin_message
+                    )
                 elif is_bilibili:
-                    await self.handle_bilibili_message(event)
+                    await self._enqueue_download(
+                        event, "bilibili", self.handle_bilibili_message
+                    )
                 elif event.message.media:
-                    await self._handle_telegram_media(event)
+                    await self._enqueue_download(
+                        event, "telegram", self._handle_telegram_media
+                    )
 
             except Exception as e:
                 logger.error(f"处理消息时出错: {str(e)}")
                 await event.reply(f"处理消息时出错: {str(e)}")
 
-    async def _handle_message_transfer(self, event):
-        """处理消息转发（适用于机器人客户端）"""
-        if not self.transfer_config:
-            return
+    async def _find_downloaded(self, event, platform):
+        """在下载索引中查找消息对应的内容，返回已有文件路径或None"""
+        text = event.message.text or ""
+        try:
+            if platform == "youtube":
+                return self.youtube_handler.find_downloaded(
+                    text.replace("m.youtube.com", "www.youtube.com")
+                )
+            if platform == "douyin":
+                match = re.findall(r"https?://v\.douyin\.com/.*?/", text)
+                return (
+                    await self.douyin_handler.find_downloaded(match[0])
+                    if match
+                    else None
+                )
+            if platform == "bilibili":
+                match = re.findall(
+                    r"https://www\.bilibili\.com/video/.*|https://b23\.tv/.*", text
+                )
+                return (
+                    await self.bilibili_handler.find_downloaded(match[0])
+                    if match
+                    else None
+                )
+            if platform == "telegram":
+                return self.telegram_handler.find_downloaded(event.message)
+        except Exception as e:
+            logger.debug(f"查询下载索引失败: {str(e)}")
+        return None
 
-        # 获取当前聊天的ID
-        chat_id = event.chat_id
+    async def _enqueue_download(self, event, platform, handler):
+        """将下载任务放入对应平台的队列，并告知用户排队位置"""
+        # 未授权的请求不占用队列，由处理函数直接回复
+        if not self.is_chat_allowed(event.chat_id):
+            await handler(event)
+            return
 
-        # 遍历转发配置
-        for transfer in self.transfer_config:
-            source_chat = transfer.get("source_chat")
-            target_chat = transfer.get("target_chat")
-            include_keywords = transfer.get("include_keywords", [])
+        # 已经下载过的内容直接回复已有文件，不再排队下载
+        existing = await self._find_downloaded(event, platform)
+        if existing:
+            await event.reply(
+                f"✅ 该内容已经下载过，无需重复下载\n保存位置: {existing}"
+            )
+            return
 
-            # 检查是否匹配源聊天
-            if str(chat_id) == str(source_chat):
-                # 检查是否需要根据关键词过滤
-                should_transfer = True
-                message_text = event.message.text if event.message.text else ""
+        async def job():
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"处理消息时出错: {str(e)}")
+                await event.reply(f"处理消息时出错: {str(e)}")
 
-                # 首先检查排除词（优先级最高）
-                exclude_words = transfer.get("exclude_words", [])
-                if exclude_words:
-                    if any(
-                        exclude_word in message_text for exclude_word in exclude_words
-                    ):
-                        should_transfer = False
-                        logger.info(f"消息包含排除词，跳过转发: {message_text[:50]}...")
-
-                # 然后检查包含词
-                if should_transfer and include_keywords:
-                    # 如果指定了关键词，至少匹配一个关键词才转发
-                    should_transfer = any(
-                        keyword in message_text for keyword in include_keywords
-                    )
+        accepted, position = self.download_queue.submit(platform, job)
+        if not accepted:
+            await event.reply(f"❌ 下载队列已满（{position} 个任务），请稍后再试。")
+        elif position:
+            await event.reply(f"⏳ 已加入下载队列，当前排在第 {position} 位。")
+
+    async def _handle_message_transfer(self, event, messages=None):
+        """处理消息转发（适用于机器人客户端）
+
+        Args:
+            event: NewMessage 或 Album 事件
+            messages: 相册中的全部消息，单条消息时为None
+        """
+        if messages is None:
+            # 相册中的消息由 Album 事件统一处理
+            if event.message.grouped_id:
+                return
+            messages = [event.message]
+
+        # 按chat_id查询规则索引，没有匹配的规则直接返回
+        rules = self.transfer_rules.rules_for_id(event.chat_id)
+        if not rules:
+            return
 
-                if should_transfer:
-                    try:
-                        # 先获取目标频道/群组的实体
-                        target_entity = await self.get_entity_safely(
-                            event.client, target_chat
-                        )
-                        if not target_entity:
-                            logger.error(
-                                f"无法获取目标频道/群组实体: {target_chat}，跳过转发"
-                            )
-                            continue
-
-                        # 检查消息是否包含photo
-                        if event.message.photo:
-                            # 如果有照片，下载到临时文件再发送
-                            temp_file_path = os.path.join(
-                                self.temp_dir, f"photo_{event.message.id}.jpg"
-                            )
-                            await event.message.download_media(temp_file_path)
-
-                            # 发送文本和照片
-                            await event.client.send_message(
-                                target_entity,
-                                (event.message.text if event.message.text else ""),
-                                file=temp_file_path,
-                            )
-
-                            # 删除临时文件
-                            if os.path.exists(temp_file_path):
-                                os.remove(temp_file_path)
-
-                            logger.info(
-                                f"已将图文消息从 {source_chat} 发送到 {target_chat}"
-                            )
-                        else:
-                            # 转发消息
-                            await event.client.forward_messages(
-                                target_entity, event.message
-                            )
-                            logger.info(
-                                f"已将消息从 {source_chat} 转发到 {target_chat}"
-                            )
-                    except Exception as e:
-                        logger.error(f"转发消息时出错: {str(e)}")
+        # 机器人客户端：包含照片的消息重新发送，其余消息直接转发
+        has_photo = any(message.photo for message in messages)
+        await self._transfer(event.client, rules, messages, lambda rule: has_photo)
 
     async def _handle_douyin_message(self, event):
         # 检查权限
@@ -360,16 +481,20 @@ class EventHandler:
         try:
             match = re.findall(r"https?://v\.douyin\.com/.*?/", event.message.text)
             if match:
-                await event.reply(f"开始下载抖音视频: {match[0]}")
+                status_message = await event.reply(f"开始下载抖音视频: {match[0]}")
                 url = match[0]
-                video = await self.douyin_handler.download_video(url)
+                progress = ProgressReporter(status_message.edit, self.progress_interval)
+                try:
+                    video = await self.douyin_handler.download_video(url, progress)
+                finally:
+                    progress.close()
                 if video:
                     await event.reply(
                         f"✅ 抖音视频下载完成！\n"
                         f"标题: {video.get('desc')}\n"
                         f"保存位置: {video.get('dest_path')}"
                     )
-                    # await self.send_video_to_user(event, video.get("dest_path"))
+                    await self.send_video_to_user(event, video.get("dest_path"))
                 else:
                     await event.reply("无法下载该抖音视频，请检查链接是否有效。")
             else:
@@ -386,13 +511,17 @@ class EventHandler:
             return
 
         status_message = await event.reply("开始解析YouTube下载链接...")
+        progress = ProgressReporter(status_message.edit, self.progress_interval)
         try:
             success, result = await self.youtube_handler.download_video(
-                event.message.text,
-                lambda msg: status_message.edit(msg) if status_message else None,
+                event.message.text, progress.status, progress=progress
             )
+            progress.close()
 
-            if success:
+            if success and not os.path.isfile(result):
+                # 播放列表返回的是下载总结，各视频已分别保存
+                await event.reply(result)
+            elif success:
                 # 判断下载的文件类型
                 file_type = "视频"
                 if result.lower().endswith((".mp3", ".m4a", ".ogg", ".wav", ".flac")):
@@ -401,10 +530,11 @@ class EventHandler:
                 await event.reply(
                     f"✅ YouTube{file_type}下载完成！\n" f"保存位置: {result}"
                 )
-                # await self.send_video_to_user(event, result)
+                await self.send_video_to_user(event, result)
             else:
                 await event.reply(f"❌ YouTube视频下载失败！\n" f"错误: {result}")
         except Exception as e:
+            progress.close()
             error_msg = str(e)
             if "Sign in to confirm you're not a bot" in error_msg:
                 await event.reply(
@@ -423,8 +553,10 @@ class EventHandler:
             return
 
         status_message = await event.reply("开始下载媒体文件...")
+        progress = ProgressReporter(status_message.edit, self.progress_interval)
         try:
-            success, result = await self.telegram_handler.process_media(event)
+            success, result = await self.telegram_handler.process_media(event, progress)
+            progress.close()
 
             if success:
                 await event.reply(
@@ -436,6 +568,7 @@ class EventHandler:
             else:
                 await event.reply(f"❌ 下载失败: {result}")
         except Exception as e:
+            progress.close()
             await event.reply(f"处理媒体文件时出错: {str(e)}")
 
     async def handle_bilibili_message(self, message):
@@ -447,19 +580,23 @@ class EventHandler:
             return False
 
         try:
-            await message.reply("正在下载B站视频，请稍候...")
+            status_message = await message.reply("正在下载B站视频，请稍候...")
             url = re.findall(
                 r"https://www\.bilibili\.com/video/.*|https://b23\.tv/.*", message.text
             )
             if url:
-                video = await self.bilibili_handler.download_video(url[0])
+                progress = ProgressReporter(status_message.edit, self.progress_interval)
+                try:
+                    video = await self.bilibili_handler.download_video(url[0], progress)
+                finally:
+                    progress.close()
                 if video:
                     await message.reply(
                         f"✅ B站视频下载完成！\n"
                         f"标题: {video.get('title')}\n"
                         f"保存位置: {video.get('path')}"
                     )
-                    # await self.send_video_to_user(message, video.get("path"))
+                    await self.send_video_to_user(message, video.get("path"))
                     return True
             else:
                 await message.reply("下载B站视频失败,请检查链接是否有效")
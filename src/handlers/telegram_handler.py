@@ -1,8 +1,12 @@
 import os
 import re
+import time
 import logging
 from datetime import datetime
-from ..utils.file_utils import move_file
+from ..utils.storage import staging_dir, publish
+from ..utils.fast_transfer import download_file_parallel
+from ..services.download_index import get_download_index
+from ..services.metrics import record_download
 from ..constants import (
     TELEGRAM_TEMP_DIR,
     TELEGRAM_VIDEOS_DIR,
@@ -16,8 +20,18 @@ logger = logging.getLogger(__name__)
 
 
 class TelegramHandler:
-    def __init__(self, config):
+    def __init__(self, config, download_index=None):
         self.config = config
+        self.download_index = (
+            download_index if download_index is not None else get_download_index()
+        )
+        download_config = config.get("telegram_download", {})
+        # 超过该大小的文件使用多连接并行下载，设为0表示关闭
+        self.parallel_threshold = (
+            download_config.get("parallel_threshold_mb", 20) * 1024 * 1024
+        )
+        self.connections = download_config.get("connections", 4)
+        self.part_size = download_config.get("part_size_kb", 512) * 1024
         self._ensure_directories()
 
     def _ensure_directories(self):
@@ -65,8 +79,74 @@ class TelegramHandler:
 
         return message_text or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-    async def process_media(self, event):
-        """处理Telegram媒体消息"""
+    @staticmethod
+    def _media_id(media):
+        """文档或照片的ID，同一文件被多次转发时ID不变"""
+        for attr in ("document", "photo"):
+            item = getattr(media, attr, None)
+            if item is not None and getattr(item, "id", None):
+                return f"{attr}_{item.id}"
+        return None
+
+    def find_downloaded(self, message):
+        """不请求网络，查找该消息中的文件是否已经下载过，返回文件路径或None"""
+        if not message.media:
+            return None
+        return self.download_index.get("telegram", self._media_id(message.media))
+
+    def _should_download_parallel(self, media):
+        """大于阈值的文档使用多连接并行下载"""
+        document = getattr(media, "document", None)
+        return (
+            self.parallel_threshold > 0
+            and document is not None
+            and (document.size or 0) >= self.parallel_threshold
+        )
+
+    async def _download_parallel(self, event, temp_dir, progress_callback=None):
+        """多连接并行下载，失败时返回None以便退回普通下载"""
+        message = event.message
+        path = os.path.join(
+            temp_dir, f"{message.media.document.id}{message.file.ext or ''}"
+        )
+        try:
+            path, _ = await download_file_parallel(
+                event.client,
+                message.media,
+                path,
+                part_size=self.part_size,
+                connections=self.connections,
+                progress_callback=progress_callback,
+            )
+            return path
+        except Exception as e:
+            logger.warning(f"并行下载失败，改用普通下载: {str(e)}")
+            return None
+
+    async def process_media(self, event, progress=None):
+        """处理Telegram媒体消息，并记录下载耗时和速度
+
+        Args:
+            event: 消息事件
+            progress: 可选的 ProgressReporter，用于汇报下载进度
+        """
+        start = time.perf_counter()
+        success, result = await self._process_media(event, progress)
+        record_download(
+            "telegram",
+            time.perf_counter() - start,
+            os.path.getsize(result["path"]) if success else None,
+            success,
+        )
+        return success, result
+
+    async def _process_media(self, event, progress=None):
+        """处理Telegram媒体消息
+
+        Args:
+            event: 消息事件
+            progress: 可选的 ProgressReporter，用于汇报下载进度
+        """
         try:
             media = event.message.media
             if not media:
@@ -84,8 +164,19 @@ class TelegramHandler:
             ) and re.search(r"[\u4e00-\u9fff]+", event.message.message):
                 filename = event.message.message
 
-            # 下载文件
-            downloaded_file = await event.message.download_media(file=TELEGRAM_TEMP_DIR)
+            # 下载到与目标目录同一文件系统的暂存目录，完成后直接 rename
+            temp_dir = staging_dir(target_dir, TELEGRAM_TEMP_DIR)
+            progress_callback = progress.telethon_callback() if progress else None
+            downloaded_file = None
+            if self._should_download_parallel(media):
+                downloaded_file = await self._download_parallel(
+                    event, temp_dir, progress_callback
+                )
+            if not downloaded_file:
+                downloaded_file = await event.message.download_media(
+                    file=temp_dir,
+                    progress_callback=progress_callback,
+                )
 
             if not downloaded_file:
                 return False, "文件下载失败"
@@ -100,16 +191,17 @@ class TelegramHandler:
 
             target_path = target_path.replace(ext + ext, ext)
 
-            success, result = move_file(downloaded_file, target_path)
-
-            if success:
-                return True, {
-                    "type": media_type,
-                    "path": result,
-                    "filename": os.path.basename(result),
-                }
-            else:
-                return False, f"移动文件失败: {result}"
+            try:
+                result = await publish(downloaded_file, target_path, progress)
+            except OSError as e:
+                return False, f"移动文件失败: {str(e)}"
+
+            self.download_index.put("telegram", self._media_id(media), result)
+            return True, {
+                "type": media_type,
+                "path": result,
+                "filename": os.path.basename(result),
+            }
 
         except Exception as e:
             logger.error(f"处理Telegram媒体文件时出错: {str(e)}")
@@ -1,30 +1,49 @@
 import os
 import re
+import time
+import asyncio
 import logging
 import yt_dlp
 import tempfile
-from ..utils.file_utils import sanitize_filename, move_file, ensure_dirs
+from ..utils.file_utils import sanitize_filename, ensure_dirs
+from ..utils.storage import staging_dir, publish
 from ..constants import YOUTUBE_TEMP_DIR, YOUTUBE_DEST_DIR, YOUTUBE_AUDIO_DIR
+from ..services.download_index import get_download_index
+from ..services.metrics import FFMPEG_SECONDS, record_download
 
 logger = logging.getLogger(__name__)
 
 
 class YouTubeHandler:
-    def __init__(self, config):
+    def __init__(self, config, download_index=None):
         self.config = config
+        self.download_index = (
+            download_index if download_index is not None else get_download_index()
+        )
         self.yt_format = config["youtube_download"].get("format", "bv*+ba/best")
         self.cookies = config["youtube_download"].get("cookies", "")
         self.audio_convert = config.get("youtube_audio_convert", {})
         self.download_list = config["youtube_download"].get("download_list", False)
+        # 播放列表并发下载数和单个视频的重试次数
+        self.playlist_concurrency = max(
+            1, int(config["youtube_download"].get("playlist_concurrency", 3))
+        )
+        self.playlist_retries = max(
+            0, int(config["youtube_download"].get("playlist_retries", 1))
+        )
 
         # 确保目录存在
         ensure_dirs(YOUTUBE_TEMP_DIR, YOUTUBE_DEST_DIR, YOUTUBE_AUDIO_DIR)
 
-    def _get_ydl_opts(self, temp_cookie_file=None):
+    def _get_ydl_opts(self, temp_cookie_file=None, progress=None):
         """获取yt-dlp选项"""
         ydl_opts = {
             "format": self.yt_format,
-            "outtmpl": os.path.join(YOUTUBE_TEMP_DIR, "%(title).100s-%(id)s.%(ext)s"),
+            # 下载到与保存目录同一文件系统的暂存目录，完成后直接 rename
+            "outtmpl": os.path.join(
+                staging_dir(YOUTUBE_DEST_DIR, YOUTUBE_TEMP_DIR),
+                "%(title).100s-%(id)s.%(ext)s",
+            ),
             "ignoreerrors": True,
             "ignore_no_formats_error": True,
             "restrictfilenames": True,
@@ -61,20 +80,30 @@ class YouTubeHandler:
         if temp_cookie_file:
             ydl_opts["cookiefile"] = temp_cookie_file
 
+        # 汇报下载进度（速度、剩余时间）
+        if progress:
+            ydl_opts["progress_hooks"] = [progress.ytdlp_hook]
+
         return ydl_opts
 
-    async def download_video(self, url, status_callback=None):
-        """下载YouTube视频（支持单个视频和播放列表）"""
+    async def download_video(self, url, status_callback=None, progress=None):
+        """下载YouTube视频（支持单个视频和播放列表）
+
+        Args:
+            url: 视频或播放列表链接
+            status_callback: 状态更新协程函数
+            progress: 可选的 ProgressReporter，用于汇报字节级下载进度
+        """
         temp_cookie_file = None
         url = url.replace("m.youtube.com", "www.youtube.com")
         try:
             if self.cookies:
                 temp_cookie_file = self._create_temp_cookie_file()
 
-            ydl_opts = self._get_ydl_opts(temp_cookie_file)
+            ydl_opts = self._get_ydl_opts(temp_cookie_file, progress)
 
             # 判断是否是播放列表
-            is_playlist = "list" in url or url.endswith("/videos")
+            is_playlist = self._is_playlist(url)
 
             if is_playlist:
                 # 检查是否允许下载播放列表
@@ -87,11 +116,15 @@ class YouTubeHandler:
                             "检测到播放列表，但配置不允许下载播放列表，将仅下载当前视频..."
                         )
                     return await self._handle_single_video(
-                        single_url, ydl_opts, status_callback
+                        single_url, ydl_opts, status_callback, progress
                     )
-                return await self._handle_playlist(url, ydl_opts, status_callback)
+                return await self._handle_playlist(
+                    url, ydl_opts, status_callback, progress
+                )
             else:
-                return await self._handle_single_video(url, ydl_opts, status_callback)
+                return await self._handle_single_video(
+                    url, ydl_opts, status_callback, progress
+                )
 
         except Exception as e:
             logger.error(f"YouTube下载失败: {str(e)}")
@@ -100,6 +133,29 @@ class YouTubeHandler:
             if temp_cookie_file and os.path.exists(temp_cookie_file):
                 os.unlink(temp_cookie_file)
 
+    @property
+    def index_format(self):
+        """下载索引中区分同一视频不同下载格式的标识"""
+        if self.audio_convert.get("enabled", False):
+            return f"{self.yt_format}|{self.audio_convert.get('format', 'mp3')}"
+        return self.yt_format
+
+    def _is_playlist(self, url):
+        return "list" in url or url.endswith("/videos")
+
+    def find_downloaded(self, url):
+        """不请求网络，查找该链接对应的视频是否已经下载过，返回文件路径或None"""
+        if self._is_playlist(url) and self.download_list:
+            return None
+        video_id_match = re.search(
+            r"(?:v=|youtu\.be/|shorts/|live/)([0-9A-Za-z_-]{11})(?:[&?#/]|$)", url
+        )
+        if not video_id_match:
+            return None
+        return self.download_index.get(
+            "youtube", video_id_match.group(1), self.index_format
+        )
+
     def _extract_single_video_url(self, url):
         """从播放列表URL中提取单个视频的URL"""
         # 尝试从带有播放列表的URL中提取视频ID
@@ -109,115 +165,266 @@ class YouTubeHandler:
             return f"https://www.youtube.com/watch?v={video_id}"
         return url
 
-    async def _handle_playlist(self, url, ydl_opts, status_callback):
-        """处理播放列表下载"""
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            if status_callback:
-                await status_callback("正在获取播放列表信息...")
+    def _thread_notifier(self, status_callback):
+        """生成可在工作线程中调用的状态通知函数，通知会被投递回事件循环执行"""
+        if not status_callback:
+            return None
 
-            info = ydl.extract_info(url, download=False)
-            if not info:
-                return False, "无法获取播放列表信息"
+        loop = asyncio.get_running_loop()
+        last_message = None
 
-            total_videos = len(info["entries"])
-            success_count = 0
-            failed_videos = []
-            playlist_title = info.get("title", "未知播放列表")
+        def notify(message):
+            nonlocal last_message
+            if message == last_message:
+                return
+            last_message = message
+            try:
+                asyncio.run_coroutine_threadsafe(status_callback(message), loop)
+            except Exception as e:
+                logger.debug(f"发送状态更新失败: {str(e)}")
 
-            if status_callback:
-                await status_callback(
-                    f"检测到播放列表：{playlist_title}\n"
-                    f"共{total_videos}个视频，开始下载..."
+        return notify
+
+    async def _extract_info(
+        self, url, ydl_opts, download, status_callback=None, output_files=None
+    ):
+        """在线程池中运行yt-dlp的提取/下载，避免阻塞事件循环
+
+        Args:
+            output_files: 可选的列表，下载时记录后处理器处理过的文件路径
+        """
+        notify = self._thread_notifier(status_callback)
+        opts = dict(ydl_opts)
+        if notify:
+
+            def progress_hook(d):
+                if d.get("status") == "finished":
+                    notify("下载完成，正在处理...")
+
+            def postprocessor_hook(d):
+                if d.get("status") == "started":
+                    notify(f"正在处理视频: {d.get('postprocessor')}...")
+
+            opts["progress_hooks"] = [
+                *opts.get("progress_hooks", []),
+                progress_hook,
+            ]
+            opts["postprocessor_hooks"] = [
+                *opts.get("postprocessor_hooks", []),
+                postprocessor_hook,
+            ]
+
+        # 统计 ffmpeg 后处理（合并、转换格式、提取音频）的耗时
+        pp_started = {}
+
+        def timing_hook(d):
+            name = d.get("postprocessor") or ""
+            if not name.startswith(("FFmpeg", "Merger")):
+                return
+            if d.get("status") == "started":
+                pp_started[name] = time.perf_counter()
+            elif d.get("status") == "finished" and name in pp_started:
+                FFMPEG_SECONDS.observe(
+                    time.perf_counter() - pp_started.pop(name),
+                    platform="youtube",
+                    operation=name,
                 )
 
-            for index, entry in enumerate(info["entries"], 1):
-                if not entry:
-                    failed_videos.append(f"视频 #{index} 无法访问（可能是私密视频）")
-                    if status_callback:
-                        await status_callback(
-                            f"⚠️ 播放列表 {playlist_title} 中的视频无法访问\n"
-                            f"序号: {index}/{total_videos}\n"
-                            f"原因: 可能是私密视频"
-                        )
-                    continue
+        opts["postprocessor_hooks"] = [
+            *opts.get("postprocessor_hooks", []),
+            timing_hook,
+        ]
 
-                try:
-                    video_url = entry.get("webpage_url") or entry.get("url")
-                    video_title = entry.get("title", "未知标题")
+        if output_files is not None:
 
-                    if not video_url:
-                        failed_videos.append(
-                            f"视频 #{index} ({video_title}) URL获取失败"
-                        )
-                        continue
-
-                    success, result = await self._download_single_video(
-                        video_url,
-                        ydl_opts,
-                        video_title,
-                        index,
-                        total_videos,
-                        status_callback,
-                    )
+            def output_hook(d):
+                filepath = d.get("info_dict", {}).get("filepath")
+                if d.get("status") == "finished" and filepath:
+                    output_files.append(filepath)
 
-                    if success:
-                        success_count += 1
-                    else:
-                        failed_videos.append(
-                            f"视频 #{index} ({video_title}) - {result}"
-                        )
+            opts["postprocessor_hooks"] = [
+                *opts.get("postprocessor_hooks", []),
+                output_hook,
+            ]
 
-                except Exception as e:
-                    failed_videos.append(
-                        f"视频 #{index} ({video_title}) 下载失败: {str(e)}"
-                    )
+        def run():
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                return ydl.extract_info(url, download=download)
+
+        return await asyncio.to_thread(run)
+
+    async def _handle_playlist(self, url, ydl_opts, status_callback, progress=None):
+        """处理播放列表下载"""
+        if status_callback:
+            await status_callback("正在获取播放列表信息...")
+
+        info = await self._extract_info(url, ydl_opts, download=False)
+        if not info:
+            return False, "无法获取播放列表信息"
 
-            # 生成总结信息
-            summary = (
-                f"📋 播放列表 {playlist_title} 下载完成！\n"
-                f"总计：{total_videos}个视频\n"
-                f"✅ 成功：{success_count}\n"
-                f"❌ 失败：{len(failed_videos)}"
+        total_videos = len(info["entries"])
+        playlist_title = info.get("title", "未知播放列表")
+
+        if status_callback:
+            await status_callback(
+                f"检测到播放列表：{playlist_title}\n"
+                f"共{total_videos}个视频，开始下载..."
             )
-            if failed_videos:
-                summary += "\n\n失败视频列表："
-                for fail in failed_videos[:10]:
-                    summary += f"\n- {fail}"
-                if len(failed_videos) > 10:
-                    summary += f"\n...等共{len(failed_videos)}个视频失败"
 
-            return True, summary
+        # 播放列表中的视频相互独立，按配置的并发数同时下载
+        semaphore = asyncio.Semaphore(self.playlist_concurrency)
+
+        async def download_entry(index, entry):
+            async with semaphore:
+                return await self._download_playlist_entry(
+                    index,
+                    entry,
+                    ydl_opts,
+                    playlist_title,
+                    total_videos,
+                    status_callback,
+                    progress,
+                )
+
+        results = await asyncio.gather(
+            *(
+                download_entry(index, entry)
+                for index, entry in enumerate(info["entries"], 1)
+            )
+        )
+        # 结果按播放列表顺序排列，None 表示下载成功
+        failed_videos = [result for result in results if result is not None]
+        success_count = len(results) - len(failed_videos)
+
+        # 生成总结信息
+        summary = (
+            f"📋 播放列表 {playlist_title} 下载完成！\n"
+            f"总计：{total_videos}个视频\n"
+            f"✅ 成功：{success_count}\n"
+            f"❌ 失败：{len(failed_videos)}"
+        )
+        if failed_videos:
+            summary += "\n\n失败视频列表："
+            for fail in failed_videos[:10]:
+                summary += f"\n- {fail}"
+            if len(failed_videos) > 10:
+                summary += f"\n...等共{len(failed_videos)}个视频失败"
+
+        return True, summary
+
+    async def _download_playlist_entry(
+        self,
+        index,
+        entry,
+        ydl_opts,
+        playlist_title,
+        total_videos,
+        status_callback,
+        progress=None,
+    ):
+        """下载播放列表中的单个视频，失败时按配置重试；成功返回None，失败返回原因"""
+        if not entry:
+            if status_callback:
+                await status_callback(
+                    f"⚠️ 播放列表 {playlist_title} 中的视频无法访问\n"
+                    f"序号: {index}/{total_videos}\n"
+                    f"原因: 可能是私密视频"
+                )
+            return f"视频 #{index} 无法访问（可能是私密视频）"
+
+        video_url = entry.get("webpage_url") or entry.get("url")
+        video_title = entry.get("title", "未知标题")
+        if not video_url:
+            return f"视频 #{index} ({video_title}) URL获取失败"
+
+        # 已经下载过的视频直接跳过
+        if self.download_index.get("youtube", entry.get("id"), self.index_format):
+            logger.info(f"视频 #{index} ({video_title}) 已下载过，跳过")
+            return None
+
+        failure = None
+        for attempt in range(self.playlist_retries + 1):
+            if attempt:
+                logger.info(
+                    f"重试下载视频 #{index} ({video_title})，第 {attempt} 次重试"
+                )
+                await asyncio.sleep(2 * attempt)
+            try:
+                success, result = await self._download_single_video(
+                    video_url,
+                    ydl_opts,
+                    video_title,
+                    index,
+                    total_videos,
+                    status_callback,
+                    progress,
+                )
+                if success:
+                    return None
+                failure = f"视频 #{index} ({video_title}) - {result}"
+            except Exception as e:
+                failure = f"视频 #{index} ({video_title}) 下载失败: {str(e)}"
+        return failure
 
-    async def _handle_single_video(self, url, ydl_opts, status_callback):
+    async def _handle_single_video(self, url, ydl_opts, status_callback, progress=None):
         """处理单个视频下载"""
         if status_callback:
             await status_callback("正在获取视频信息...")
 
         success, result = await self._download_single_video(
-            url, ydl_opts, None, None, None, status_callback
+            url, ydl_opts, None, None, None, status_callback, progress
         )
         return success, result
 
     async def _download_single_video(
-        self, url, ydl_opts, title=None, index=None, total=None, status_callback=None
+        self,
+        url,
+        ydl_opts,
+        title=None,
+        index=None,
+        total=None,
+        status_callback=None,
+        progress=None,
     ):
         """下载单个视频的具体实现"""
+        start = time.perf_counter()
+        success, result = False, None
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                if status_callback:
-                    status_msg = "开始下载YouTube视频"
-                    if title and index and total:
-                        status_msg += f"：{title}\n序号: {index}/{total}"
-                    await status_callback(status_msg)
-
-                info = ydl.extract_info(url, download=True)
-                if not info:
-                    return False, "无法获取视频信息"
+            if status_callback:
+                status_msg = "开始下载YouTube视频"
+                if title and index and total:
+                    status_msg += f"：{title}\n序号: {index}/{total}"
+                await status_callback(status_msg)
+
+            output_files = []
+            info = await self._extract_info(
+                url,
+                ydl_opts,
+                download=True,
+                status_callback=status_callback,
+                output_files=output_files,
+            )
+            if not info:
+                return False, "无法获取视频信息"
 
-                return self._process_downloaded_video(info)
+            success, result = await self._process_downloaded_video(
+                info, output_files, progress
+            )
+            if success:
+                self.download_index.put(
+                    "youtube", info.get("id"), result, self.index_format
+                )
+            return success, result
 
         except Exception as e:
             return False, str(e)
+        finally:
+            record_download(
+                "youtube",
+                time.perf_counter() - start,
+                os.path.getsize(result) if success else None,
+                success,
+            )
 
     def _create_temp_cookie_file(self):
         """创建临时cookies文件"""
@@ -238,31 +445,51 @@ class YouTubeHandler:
 
         return temp_file.name
 
-    def _process_downloaded_video(self, info):
-        """处理下载完成的视频"""
-        video_id = info["id"]
+    @staticmethod
+    def _downloaded_paths(info, output_files=()):
+        """yt-dlp 实际输出的文件
+
+        requested_downloads 中记录的是后处理完成后的最终路径；后处理器钩子记录的是
+        各个后处理器的输入文件，其中保留下来的（如 keepvideo 时的原视频）也一并返回。
+        """
+        paths = [
+            download.get("filepath")
+            for download in info.get("requested_downloads") or []
+        ]
+        paths += output_files
+        return [path for path in dict.fromkeys(paths) if path and os.path.isfile(path)]
+
+    async def _process_downloaded_video(self, info, output_files=(), progress=None):
+        """处理下载完成的视频，把文件发布到保存目录
+
+        Args:
+            progress: 可选的 ProgressReporter，跨设备保存时汇报复制进度
+        """
         video_title = info["title"]
 
         # 处理下载的所有文件(视频和音频)
         downloaded_files = []
-        for file in os.listdir(YOUTUBE_TEMP_DIR):
-            if video_id in file:
-                source_path = os.path.join(YOUTUBE_TEMP_DIR, file)
-                file_ext = os.path.splitext(file)[1][1:]  # 获取扩展名（去掉点）
+        for source_path in self._downloaded_paths(info, output_files):
+            file_ext = os.path.splitext(source_path)[1][1:]  # 获取扩展名（去掉点）
 
-                # 根据文件类型选择保存目录
-                is_audio = file_ext.lower() in ["mp3", "m4a", "ogg", "wav", "flac"]
-                target_dir = YOUTUBE_AUDIO_DIR if is_audio else YOUTUBE_DEST_DIR
+            # 根据文件类型选择保存目录
+            is_audio = file_ext.lower() in ["mp3", "m4a", "ogg", "wav", "flac"]
+            target_dir = YOUTUBE_AUDIO_DIR if is_audio else YOUTUBE_DEST_DIR
 
-                target_path = os.path.join(
-                    target_dir, f"{sanitize_filename(video_title)}.{file_ext}"
-                )
+            target_path = os.path.join(
+                target_dir, f"{sanitize_filename(video_title)}.{file_ext}"
+            )
 
-                success, result = move_file(source_path, target_path)
-                if success:
-                    downloaded_files.append(target_path)
-                else:
-                    logger.error(f"移动文件失败: {result}")
+            try:
+                await publish(
+                    source_path,
+                    target_path,
+                    progress,
+                    label=f"保存 {os.path.basename(target_path)}",
+                )
+                downloaded_files.append(target_path)
+            except OSError as e:
+                logger.error(f"移动文件失败: {str(e)}")
 
         if downloaded_files:
             # 如果启用了音频转换，并且有对应格式的音频文件，返回音频文件
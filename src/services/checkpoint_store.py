@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class TransferCheckpointStore:
+    """频道转发断点存储
+
+    按 (源频道, 目标频道) 记录最后一条已转发消息的ID，
+    重启后从断点继续，只拉取 ID 更大的消息，避免重复转发。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        async with self._lock:
+            if self._db is None:
+                self._db = await aiosqlite.connect(self.path)
+                await self._db.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS transfer_checkpoints (
+                        source_id INTEGER NOT NULL,
+                        target_id INTEGER NOT NULL,
+                        last_message_id INTEGER NOT NULL,
+                        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (source_id, target_id)
+                    )
+                    """
+                )
+                await self._db.commit()
+        return self._db
+
+    async def get(self, source_id, target_id):
+        """获取断点，没有记录时返回0"""
+        db = await self._connect()
+        async with db.execute(
+            "SELECT last_message_id FROM transfer_checkpoints "
+            "WHERE source_id = ? AND target_id = ?",
+            (source_id, target_id),
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def set(self, source_id, target_id, message_id):
+        """更新断点（只会向前推进）"""
+        db = await self._connect()
+        await db.execute(
+            """
+            INSERT INTO transfer_checkpoints (source_id, target_id, last_message_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT (source_id, target_id) DO UPDATE SET
+                last_message_id = MAX(last_message_id, excluded.last_message_id),
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (source_id, target_id, message_id),
+        )
+        await db.commit()
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import logging
+from ..constants import CONFIG_DIR
+
+logger = logging.getLogger(__name__)
+
+_index = None
+
+
+def get_download_index():
+    """获取全局共享的下载索引，首次调用时从磁盘加载"""
+    global _index
+    if _index is None:
+        _index = DownloadIndex(os.path.join(CONFIG_DIR, "download_index.json"))
+    return _index
+
+
+class DownloadIndex:
+    """已下载内容索引
+
+    记录 (平台, 来源ID, 格式) → 本地文件路径，重复请求同一内容时直接返回已有文件，
+    无需再次下载和转码。加载时以及每次查询时都会检查文件是否仍然存在，
+    已被删除的文件会从索引中移除。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        # "平台:来源ID:格式" -> {"path": 文件路径, "ts": 记录时间}
+        self._entries = {}
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(platform, source_id, fmt=""):
+        return f"{platform}:{source_id}:{fmt or ''}"
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                self._entries = json.load(file)
+            removed = self.prune()
+            logger.info(
+                f"已加载下载索引: {len(self._entries)} 条记录"
+                + (f"，移除 {removed} 条已删除文件的记录" if removed else "")
+            )
+        except Exception as e:
+            logger.error(f"加载下载索引失败: {str(e)}")
+
+    def save(self):
+        """原子写入索引文件"""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._entries, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"保存下载索引失败: {str(e)}")
+
+    def prune(self):
+        """移除文件已不存在的记录，返回移除的数量"""
+        missing = [
+            key
+            for key, entry in self._entries.items()
+            if not os.path.exists(entry["path"])
+        ]
+        for key in missing:
+            del self._entries[key]
+        if missing:
+            self.save()
+        return len(missing)
+
+    # ------------------------------------------------------------------
+    # 查询与记录
+    # ------------------------------------------------------------------
+    def get(self, platform, source_id, fmt=""):
+        """返回已下载文件的路径，不存在或文件已被删除时返回None"""
+        if not source_id:
+            return None
+        key = self._key(platform, source_id, fmt)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry["path"]):
+            del self._entries[key]
+            self.save()
+            return None
+        return entry["path"]
+
+    def put(self, platform, source_id, path, fmt=""):
+        """记录下载完成的文件"""
+        if not source_id or not path:
+            return
+        self._entries[self._key(platform, source_id, fmt)] = {
+            "path": os.path.abspath(path),
+            "ts": time.time(),
+        }
+        self.save()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from .metrics import QUEUE_DEPTH, QUEUE_ACTIVE, QUEUE_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# 各平台默认的并发下载数
+DEFAULT_WORKERS = {
+    "youtube": 1,
+    "douyin": 2,
+    "bilibili": 2,
+    "telegram": 3,
+}
+
+
+class DownloadQueue:
+    """下载任务队列
+
+    每个平台一个有界队列和固定数量的worker，任务按提交顺序执行。
+    队列已满时拒绝新任务，避免大量下载和ffmpeg任务同时运行。
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.max_size = config.get("max_size", 20)
+        self.workers = {**DEFAULT_WORKERS, **(config.get("workers") or {})}
+        self._queues = {}
+        self._tasks = {}
+        # 每个平台排队中和执行中的任务数
+        self._pending = {}
+
+    def _ensure_workers(self, platform):
+        """首次提交任务时创建该平台的队列和worker"""
+        if platform in self._queues:
+            return self._queues[platform]
+
+        queue = asyncio.Queue(maxsize=self.max_size)
+        self._queues[platform] = queue
+        self._pending[platform] = 0
+        worker_count = max(1, int(self.workers.get(platform, 1)))
+        self._tasks[platform] = [
+            asyncio.create_task(self._worker(platform, queue))
+            for _ in range(worker_count)
+        ]
+        QUEUE_DEPTH.track(queue.qsize, platform=platform)
+        QUEUE_ACTIVE.track(lambda: self._pending[platform], platform=platform)
+        logger.info(f"已启动 {platform} 下载队列，worker数: {worker_count}")
+        return queue
+
+    async def _worker(self, platform, queue):
+        while True:
+            job = await queue.get()
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{platform} 下载任务执行失败: {str(e)}")
+            finally:
+                self._pending[platform] -= 1
+                queue.task_done()
+
+    def submit(self, platform, job):
+        """提交下载任务
+
+        Args:
+            platform: 平台名称，如 youtube、douyin、bilibili、telegram
+            job: 无参数的协程函数
+
+        Returns:
+            (是否接受, 排队位置)。位置为0表示立即开始执行；
+            未接受时第二项为队列容量。
+        """
+        queue = self._ensure_workers(platform)
+        try:
+            queue.put_nowait(job)
+        except asyncio.QueueFull:
+            logger.warning(f"{platform} 下载队列已满，拒绝新任务")
+            QUEUE_REJECTED.inc(platform=platform)
+            return False, self.max_size
+
+        pending = self._pending[platform]
+        self._pending[platform] = pending + 1
+        worker_count = len(self._tasks[platform])
+        position = max(0, pending - worker_count + 1)
+        return True, position
+
+    def depth(self, platform=None):
+        """排队中的任务数（不含执行中的任务）"""
+        if platform is not None:
+            queue = self._queues.get(platform)
+            return queue.qsize() if queue else 0
+        return sum(queue.qsize() for queue in self._queues.values())
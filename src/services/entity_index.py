@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+from telethon import utils, errors, events
+from telethon.tl.types import (
+    User,
+    Chat,
+    Channel,
+    InputPeerUser,
+    InputPeerChat,
+    InputPeerChannel,
+)
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# 每个客户端（账号）一份索引：access_hash 与账号绑定，不能跨账号复用
+_indexes = weakref.WeakKeyDictionary()
+
+
+def get_entity_index(client, options=None):
+    """获取客户端对应的实体索引，首次调用时创建并从磁盘加载"""
+    index = _indexes.get(client)
+    if index is None:
+        options = options or {}
+        index = EntityIndex(
+            path=_index_path(client),
+            max_size=options.get("max_size", 5000),
+            ttl=options.get("ttl_hours", 168) * 3600,
+            negative_ttl=options.get("negative_ttl_minutes", 10) * 60,
+            sweep_interval=options.get("sweep_interval_minutes", 60) * 60,
+        )
+        _indexes[client] = index
+    return index
+
+
+def save_entity_indexes():
+    """保存全部有未写入修改的实体索引（程序退出时调用）"""
+    for index in list(_indexes.values()):
+        if index._dirty:
+            index.save()
+
+
+def _index_path(client):
+    """索引文件与会话文件放在一起，例如 config/user_session.entities.json"""
+    filename = getattr(client.session, "filename", None)
+    if not filename:
+        return None
+    return f"{os.path.splitext(filename)[0]}.entities.json"
+
+
+def _normalize_key(entity_id):
+    """数字ID统一为int，用户名统一为小写的 @username"""
+    if isinstance(entity_id, int):
+        return entity_id
+    entity_id = str(entity_id).strip()
+    if entity_id.lstrip("-").isdigit():
+        return int(entity_id)
+    if entity_id.startswith("@"):
+        return entity_id.lower()
+    return None
+
+
+class EntityIndex:
+    """持久化的对话/实体索引
+
+    - 数字ID的解析只在首次未命中时遍历一次对话列表（之后按 sweep_interval 限频）
+    - 结果持久化到磁盘，重启后无需重新遍历
+    - 通过 observe() 从收到的更新中持续补充
+    - LRU + TTL 淘汰，并对无法解析的ID做负缓存
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_size=5000,
+        ttl=7 * 24 * 3600,
+        negative_ttl=600,
+        sweep_interval=3600,
+        save_interval=60,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.sweep_interval = sweep_interval
+        self.save_interval = save_interval
+
+        # peer_id -> 记录（可序列化部分 + 内存中的完整实体）
+        self._entries = OrderedDict()
+        # @username -> peer_id
+        self._usernames = {}
+        # key -> 负缓存过期时间
+        self._negative = {}
+        self._entities = {}
+        self._last_sweep = None
+        self._sweep_lock = asyncio.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._tracking = False
+        self.hits = 0
+        self.misses = 0
+
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                records = json.load(file)
+            now = time.time()
+            for record in records:
+                if now - record.get("ts", 0) > self.ttl:
+                    continue
+                self._store(record)
+            logger.info(f"已加载实体索引: {len(self._entries)} 条记录")
+        except Exception as e:
+            logger.error(f"加载实体索引失败: {str(e)}")
+
+    def save(self):
+        """原子写入索引文件"""
+        if not self.path:
+            return
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(list(self._entries.values()), file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except Exception as e:
+            logger.error(f"保存实体索引失败: {str(e)}")
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    # ------------------------------------------------------------------
+    # 索引维护
+    # ------------------------------------------------------------------
+    def _store(self, record, entity=None):
+        peer_id = record["peer_id"]
+        old = self._entries.pop(peer_id, None)
+        if old and old.get("username"):
+            self._usernames.pop(f"@{old['username'].lower()}", None)
+        self._entries[peer_id] = record
+        if entity is not None:
+            self._entities[peer_id] = entity
+        if record.get("username"):
+            username_key = f"@{record['username'].lower()}"
+            self._usernames[username_key] = peer_id
+            self._negative.pop(username_key, None)
+        self._negative.pop(peer_id, None)
+
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, peer_id):
+        """删除一条记录及其用户名映射"""
+        record = self._entries.pop(peer_id, None)
+        self._entities.pop(peer_id, None)
+        if record and record.get("username"):
+            username_key = f"@{record['username'].lower()}"
+            if self._usernames.get(username_key) == peer_id:
+                del self._usernames[username_key]
+
+    def remember(self, entity):
+        """记录一个实体（User/Chat/Channel）"""
+        if not isinstance(entity, (User, Chat, Channel)):
+            return
+        # min实体的access_hash只在特定上下文中有效，不能缓存
+        if getattr(entity, "min", False):
+            return
+        peer_id = utils.get_peer_id(entity)
+        access_hash = getattr(entity, "access_hash", None)
+        username = getattr(entity, "username", None)
+        existing = self._entries.get(peer_id)
+        if (
+            existing
+            and existing["access_hash"] == access_hash
+            and existing["username"] == username
+            and time.time() - existing["ts"] < self.ttl / 2
+        ):
+            # 记录未变化，只刷新内存中的实体和LRU顺序
+            self._entities[peer_id] = entity
+            self._entries.move_to_end(peer_id)
+            return
+
+        if isinstance(entity, User):
+            kind, name = "user", utils.get_display_name(entity)
+        elif isinstance(entity, Chat):
+            kind, name = "chat", entity.title
+        else:
+            kind, name = "channel", entity.title
+
+        record = {
+            "peer_id": peer_id,
+            "type": kind,
+            "id": entity.id,
+            "access_hash": access_hash,
+            "username": username,
+            "name": name,
+            "ts": time.time(),
+        }
+        self._store(record, entity)
+        self._dirty = True
+
+    def remember_input_peer(self, peer):
+        """记录从会话缓存中取得的 InputPeer（没有用户名和名称）"""
+        if isinstance(peer, InputPeerUser):
+            kind, entity_id, access_hash = "user", peer.user_id, peer.access_hash
+        elif isinstance(peer, InputPeerChat):
+            kind, entity_id, access_hash = "chat", peer.chat_id, None
+        elif isinstance(peer, InputPeerChannel):
+            kind, entity_id, access_hash = "channel", peer.channel_id, peer.access_hash
+        else:
+            return
+        peer_id = utils.get_peer_id(peer)
+        if peer_id in self._entries:
+            # 已有完整记录（可能带用户名），只刷新LRU顺序
+            self._entries.move_to_end(peer_id)
+            return
+        record = {
+            "peer_id": peer_id,
+            "type": kind,
+            "id": entity_id,
+            "access_hash": access_hash,
+            "username": None,
+            "name": None,
+            "ts": time.time(),
+        }
+        self._store(record)
+        self._dirty = True
+
+    def observe(self, event):
+        """从收到的更新中补充索引（只使用已缓存的实体，不请求网络）"""
+        for entity in (getattr(event, "chat", None), getattr(event, "sender", None)):
+            if entity is not None:
+                self.remember(entity)
+        self._maybe_save()
+
+    def track(self, client):
+        """注册更新处理器，使索引随收到的消息和聊天变动保持最新"""
+        if self._tracking:
+            return
+        self._tracking = True
+
+        @client.on(events.NewMessage)
+        @client.on(events.ChatAction)
+        async def _observe(event):
+            self.observe(event)
+
+    def _lookup(self, key):
+        """查询缓存：返回 (命中与否, 实体或InputPeer)"""
+        if isinstance(key, str):
+            peer_id = self._usernames.get(key)
+            if peer_id is None:
+                return False, None
+        else:
+            peer_id = key
+
+        record = self._entries.get(peer_id)
+        if record is None:
+            if isinstance(key, str):
+                # 记录已被淘汰，用户名映射也已失效
+                self._usernames.pop(key, None)
+            return False, None
+        if time.time() - record["ts"] > self.ttl:
+            self._drop(peer_id)
+            return False, None
+
+        self._entries.move_to_end(peer_id)
+        entity = self._entities.get(peer_id)
+        if entity is not None:
+            return True, entity
+        return True, self._input_peer(record)
+
+    @staticmethod
+    def _input_peer(record):
+        if record["type"] == "user":
+            return InputPeerUser(record["id"], record["access_hash"] or 0)
+        if record["type"] == "chat":
+            return InputPeerChat(record["id"])
+        return InputPeerChannel(record["id"], record["access_hash"] or 0)
+
+    def _is_negative(self, key):
+        expires = self._negative.get(key)
+        if expires is None:
+            return False
+        if time.monotonic() >= expires:
+            del self._negative[key]
+            return False
+        return True
+
+    def _mark_negative(self, key):
+        self._negative[key] = time.monotonic() + self.negative_ttl
+
+    async def sweep(self, client):
+        """遍历一次对话列表，将全部对话写入索引"""
+        async with self._sweep_lock:
+            if (
+                self._last_sweep is not None
+                and time.monotonic() - self._last_sweep < self.sweep_interval
+            ):
+                return
+            logger.info("正在遍历对话列表以构建实体索引...")
+            count = 0
+            async for dialog in client.iter_dialogs():
+                self.remember(dialog.entity)
+                count += 1
+            self._last_sweep = time.monotonic()
+            logger.info(f"实体索引构建完成，共 {count} 个对话")
+            self.save()
+
+    # ------------------------------------------------------------------
+    # 解析
+    # ------------------------------------------------------------------
+    async def resolve(self, client, entity_id):
+        """解析实体：缓存 → 会话缓存 → 一次对话遍历 / get_entity；失败会被负缓存"""
+        key = _normalize_key(entity_id)
+        if key is None:
+            # 其他格式（如 t.me 链接）直接交给 Telethon 处理
+            return await client.get_entity(entity_id)
+
+        found, entity = self._lookup(key)
+        if found:
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="entity", result="hit")
+            return entity
+        if self._is_negative(key):
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="entity", result="negative_hit")
+            return None
+        self.misses += 1
+        CACHE_LOOKUPS.inc(cache="entity", result="miss")
+
+        try:
+            if isinstance(key, int):
+                # 先尝试会话自带的实体缓存（不请求网络）
+                try:
+                    peer = await client.get_input_entity(key)
+                    self.remember_input_peer(peer)
+                    self._maybe_save()
+                    return peer
+                except ValueError:
+                    pass
+
+                await self.sweep(client)
+                found, entity = self._lookup(key)
+                if found:
+                    return entity
+                logger.error(f"未找到ID为 {entity_id} 的频道/群组")
+            else:
+                entity = await client.get_entity(key)
+                self.remember(entity)
+                self._maybe_save()
+                return entity
+        except errors.UsernameNotOccupiedError:
+            logger.error(f"用户名 {entity_id} 不存在")
+        except ValueError as e:
+            logger.error(f"实体获取失败: {str(e)}")
+
+        self._mark_negative(key)
+        return None
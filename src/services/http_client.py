@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import importlib.util
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientService:
+    """共享的异步HTTP客户端
+
+    所有平台处理器共用一个长连接池（keep-alive，可选HTTP/2），复用TLS握手；
+    按主机限制并发连接数。http.use_proxy 开启时使用配置文件中的 proxy。
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        http_config = config.get("http") or {}
+        self.timeout = http_config.get("timeout", 30)
+        self.max_connections = http_config.get("max_connections", 100)
+        self.connections_per_host = max(1, http_config.get("connections_per_host", 6))
+        self.http2 = http_config.get("http2", True)
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.info("未安装 h2，HTTP/2 已关闭（pip install httpx[http2]）")
+            self.http2 = False
+
+        self.proxy = None
+        proxy_config = config.get("proxy") or {}
+        if (
+            http_config.get("use_proxy", False)
+            and proxy_config.get("enabled")
+            and proxy_config.get("host")
+            and proxy_config.get("port")
+        ):
+            if importlib.util.find_spec("socksio") is None:
+                logger.warning(
+                    "未安装 socksio，HTTP 连接池不使用代理（pip install httpx[socks]）"
+                )
+            else:
+                self.proxy = f"socks5://{proxy_config['host']}:{proxy_config['port']}"
+
+        self._client = None
+        # (主机, 限制值) -> 信号量
+        self._host_limits = {}
+
+    @property
+    def client(self):
+        """首次使用时创建连接池"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                proxy=self.proxy,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def host_limit(self, url, limit=None):
+        """同一主机、同一限制值的请求共享的并发连接限制
+
+        Args:
+            limit: 该主机的最大并发连接数，默认使用 http.connections_per_host；
+                不同的限制值各自计数，互不覆盖
+        """
+        key = (urlsplit(url).hostname, limit or self.connections_per_host)
+        semaphore = self._host_limits.get(key)
+        if semaphore is None:
+            semaphore = self._host_limits[key] = asyncio.Semaphore(key[1])
+        return semaphore
+
+    @asynccontextmanager
+    async def stream(self, method, url, limit=None, **kwargs):
+        """在主机连接限制内发起流式请求"""
+        async with self.host_limit(url, limit):
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def request(self, method, url, limit=None, **kwargs):
+        async with self.host_limit(url, limit):
+            return await self.client.request(method, url, **kwargs)
+
+    async def resolve_redirect(self, url, **kwargs):
+        """跟随重定向，返回最终的URL"""
+        response = await self.request("HEAD", url, follow_redirects=True, **kwargs)
+        return str(response.url)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,391 @@
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 耗时类直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 下载、转码等较慢操作的分桶（秒）
+SLOW_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# 下载速度分桶（字节/秒）
+SPEED_BUCKETS = tuple(2**power * 1024 for power in range(4, 17, 2))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # yt-dlp 等回调在工作线程中记录指标
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """返回 [(名称后缀, 标签值, 额外标签, 数值), ...]"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值，也可以在导出时通过回调读取"""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def track(self, function, **labels):
+        """导出时调用 function() 取值，如队列长度"""
+        self._functions[self._key(labels)] = function
+
+    def value(self, **labels):
+        key = self._key(labels)
+        function = self._functions.get(key)
+        return function() if function else self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, function in list(self._functions.items()):
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.debug(f"读取指标 {self.name} 失败: {str(e)}")
+        return [("", key, None, value) for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """分桶统计的分布（如耗时），导出 _bucket、_sum、_count"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数..., 总和, 总数]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块的耗时（同步和异步代码中均可使用 with）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        for key, state in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append(
+                    ("_bucket", key, f'le="{_format_value(float(bound))}"', cumulative)
+                )
+            samples.append(("_bucket", key, 'le="+Inf"', state[-1]))
+            samples.append(("_sum", key, None, state[-2]))
+            samples.append(("_count", key, None, state[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序导出为 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"指标 {name} 已注册为 {metric.type}")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+# ----------------------------------------------------------------------
+# 指标定义
+# ----------------------------------------------------------------------
+DOWNLOAD_SECONDS = registry.histogram(
+    "tga_download_duration_seconds",
+    "各平台单个下载任务的耗时",
+    ["platform", "status"],
+    SLOW_BUCKETS,
+)
+DOWNLOAD_BYTES = registry.counter(
+    "tga_download_bytes_total", "各平台下载完成的字节数", ["platform"]
+)
+DOWNLOAD_SPEED = registry.histogram(
+    "tga_download_speed_bytes_per_second",
+    "各平台单个下载任务的平均速度",
+    ["platform"],
+    SPEED_BUCKETS,
+)
+FFMPEG_SECONDS = registry.histogram(
+    "tga_ffmpeg_duration_seconds",
+    "ffmpeg 合并、转码等后处理的耗时",
+    ["platform", "operation"],
+    SLOW_BUCKETS,
+)
+UPLOAD_SECONDS = registry.histogram(
+    "tga_upload_duration_seconds",
+    "把下载的文件发送回聊天的耗时",
+    ["mode"],
+    SLOW_BUCKETS,
+)
+QUEUE_DEPTH = registry.gauge(
+    "tga_download_queue_depth", "各平台下载队列中等待的任务数", ["platform"]
+)
+QUEUE_ACTIVE = registry.gauge(
+    "tga_download_queue_pending", "各平台排队中和执行中的任务数", ["platform"]
+)
+QUEUE_REJECTED = registry.counter(
+    "tga_download_queue_rejected_total", "队列已满被拒绝的任务数", ["platform"]
+)
+FORWARD_SECONDS = registry.histogram(
+    "tga_forward_duration_seconds",
+    "按转发规则转发一条消息或相册的耗时",
+    ["rule", "mode"],
+)
+FORWARD_TOTAL = registry.counter(
+    "tga_forward_messages_total", "按转发规则转发的消息数", ["rule", "status"]
+)
+CHANNEL_TRANSFER_SECONDS = registry.histogram(
+    "tga_channel_transfer_batch_duration_seconds",
+    "频道搬运中每次转发请求（批量转发或单条重新发送）的耗时",
+    ["mode"],
+)
+CHANNEL_TRANSFER_MESSAGES = registry.counter(
+    "tga_channel_transfer_messages_total", "频道搬运的消息数", ["mode", "status"]
+)
+SCHEDULED_MESSAGES = registry.counter(
+    "tga_scheduled_messages_total", "定时消息的发送次数", ["status"]
+)
+SCHEDULED_DELAY = registry.histogram(
+    "tga_scheduled_message_delay_seconds", "定时消息实际发送时间相对计划时间的延迟"
+)
+FLOOD_WAITS = registry.counter(
+    "tga_flood_waits_total",
+    "Telegram 返回 FloodWait/SlowModeWait 的次数",
+    ["client", "method"],
+)
+FLOOD_WAIT_SECONDS = registry.counter(
+    "tga_flood_wait_seconds_total",
+    "FloodWait/SlowModeWait 要求等待的总秒数",
+    ["client", "method"],
+)
+RATE_LIMIT_RATE = registry.gauge(
+    "tga_rate_limit_rate",
+    "限速器当前允许的请求速率（次/秒），遇到 FloodWait 后降低并逐步恢复",
+    ["client", "method"],
+)
+RATE_LIMIT_BLOCKED = registry.gauge(
+    "tga_rate_limit_blocked_seconds",
+    "限速器因 FloodWait 暂停发放令牌的剩余秒数",
+    ["client", "method"],
+)
+RATE_LIMIT_THROTTLED_CHATS = registry.gauge(
+    "tga_rate_limit_throttled_chats",
+    "速率仍低于初始值的聊天级令牌桶数量",
+    ["client"],
+)
+CACHE_LOOKUPS = registry.counter(
+    "tga_cache_lookups_total", "实体索引、短链接缓存的查询次数", ["cache", "result"]
+)
+LOOP_LAG = registry.histogram(
+    "tga_event_loop_lag_seconds", "事件循环调度延迟（定时器实际触发时间与预期之差）"
+)
+LOOP_LAG_CURRENT = registry.gauge(
+    "tga_event_loop_lag_current_seconds", "最近一次测得的事件循环调度延迟"
+)
+
+
+def record_download(platform, seconds, size=None, success=True):
+    """记录一次下载的耗时，成功时同时记录字节数和平均速度"""
+    DOWNLOAD_SECONDS.observe(
+        seconds, platform=platform, status="success" if success else "error"
+    )
+    if success and size:
+        DOWNLOAD_BYTES.inc(size, platform=platform)
+        if seconds > 0:
+            DOWNLOAD_SPEED.observe(size / seconds, platform=platform)
+
+
+# ----------------------------------------------------------------------
+# 事件循环延迟与 HTTP 导出
+# ----------------------------------------------------------------------
+async def monitor_loop_lag(interval=1.0):
+    """周期性测量 asyncio.sleep 的实际唤醒时间与预期之差"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_CURRENT.set(lag)
+
+
+class MetricsServer:
+    """只提供 GET /metrics 的最小 HTTP 服务，供 Prometheus 抓取"""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.host = config.get("host", "127.0.0.1")
+        self.port = config.get("port", 9464)
+        self.loop_lag_interval = config.get("loop_lag_interval", 1.0)
+        self._server = None
+        self._lag_task = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if self.loop_lag_interval > 0:
+            self._lag_task = asyncio.create_task(
+                monitor_loop_lag(self.loop_lag_interval)
+            )
+        logger.info(f"指标服务已启动: http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            # 读完请求头，内容不需要
+            while (await asyncio.wait_for(reader.readline(), 10)).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1] in ("/metrics", "/"):
+                status = "200 OK"
+                body = registry.render().encode()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status = "404 Not Found"
+                body = b"not found\n"
+                content_type = "text/plain; charset=utf-8"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"指标请求处理失败: {str(e)}")
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,267 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from telethon import errors, utils
+from telethon.tl.functions.messages import (
+    SendMessageRequest,
+    SendMediaRequest,
+    SendMultiMediaRequest,
+    ForwardMessagesRequest,
+    EditMessageRequest,
+)
+from telethon.tl.functions.upload import (
+    GetFileRequest,
+    SaveFilePartRequest,
+    SaveBigFilePartRequest,
+)
+from .metrics import (
+    FLOOD_WAITS,
+    FLOOD_WAIT_SECONDS,
+    RATE_LIMIT_RATE,
+    RATE_LIMIT_BLOCKED,
+    RATE_LIMIT_THROTTLED_CHATS,
+)
+
+logger = logging.getLogger(__name__)
+
+# 请求类型 -> 方法分类
+METHOD_CLASSES = {
+    SendMessageRequest: "send",
+    SendMediaRequest: "send",
+    SendMultiMediaRequest: "send",
+    ForwardMessagesRequest: "forward",
+    EditMessageRequest: "edit",
+    GetFileRequest: "download",
+    SaveFilePartRequest: "upload",
+    SaveBigFilePartRequest: "upload",
+}
+
+# 默认速率：(每秒请求数, 突发容量)
+DEFAULT_RATES = {
+    "client": (60.0, 60),
+    "send": (5.0, 5),
+    "forward": (2.0, 2),
+    "edit": (1.0, 3),
+    "download": (50.0, 50),
+    "upload": (50.0, 50),
+}
+
+# 单个聊天内的默认速率，只对发送类请求生效
+DEFAULT_CHAT_RATES = {
+    "send": (1.0, 3),
+    "forward": (1.0, 2),
+    "edit": (0.5, 2),
+}
+
+# 最多保留的聊天级令牌桶数量
+MAX_CHAT_BUCKETS = 1000
+
+
+# 客户端上记录已安装限速器的属性名
+INSTALLED_ATTR = "_tga_rate_limiter"
+
+
+class TokenBucket:
+    """令牌桶，速率可根据FloodWait自适应调整（乘性降低、加性恢复）"""
+
+    def __init__(self, rate, capacity, min_rate=0.05):
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """取得一个令牌，必要时等待（按到达顺序排队）"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def slow_down(self, seconds=0, block=True):
+        """遇到FloodWait：速率减半，并在等待时间内暂停发放令牌"""
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+        if block:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def recover(self):
+        """请求成功：逐步恢复到初始速率"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+    @property
+    def throttled(self):
+        """速率是否仍低于初始值"""
+        return self.rate < self.base_rate
+
+    def blocked_for(self):
+        """因FloodWait暂停发放令牌的剩余秒数"""
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+class RateLimiter:
+    """所有客户端共享的Telegram请求限速器
+
+    通过 install(client) 接管客户端的底层请求方法，发送、转发、编辑、下载、上传
+    请求依次经过三级令牌桶：客户端、方法分类、目标聊天。
+    遇到FloodWait时降低对应速率，等待后重试失败的请求。
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.max_flood_wait = config.get("max_flood_wait", 300)
+        self.max_retries = config.get("max_retries", 3)
+        self.rates = {
+            **DEFAULT_RATES,
+            **{k: tuple(v) for k, v in (config.get("rates") or {}).items()},
+        }
+        self.chat_rates = {
+            **DEFAULT_CHAT_RATES,
+            **{k: tuple(v) for k, v in (config.get("chat_rates") or {}).items()},
+        }
+        # (客户端名称, 分类) -> 令牌桶
+        self._buckets = {}
+        # (客户端名称, 分类, 聊天ID) -> 令牌桶
+        self._chat_buckets = OrderedDict()
+        self._clients = {}
+
+    def install(self, client, name=None):
+        """接管客户端的请求，返回实际生效的限速器
+
+        依赖 Telethon 1.x 的私有方法
+        TelegramClient._call(sender, request, ordered=False, flood_sleep_threshold=None)
+        （requirements.txt 中的 1.39 与 1.45 签名相同），升级 Telethon 时需要确认。
+        客户端上的 INSTALLED_ATTR 标记已安装的限速器：已安装过（无论是否为同一个
+        限速器）时不会重复包装，直接返回已安装的限速器。
+        """
+        installed = getattr(client, INSTALLED_ATTR, None)
+        if installed is not None:
+            return installed
+        name = name or f"client{len(self._clients) + 1}"
+        self._clients[name] = client
+        setattr(client, INSTALLED_ATTR, self)
+        # FloodWait统一由限速器处理，Telethon 不再自行等待
+        client.flood_sleep_threshold = 0
+        original_call = client._call
+
+        async def _call(sender, request, ordered=False, flood_sleep_threshold=None):
+            return await self._call(name, original_call, sender, request, ordered)
+
+        client._call = _call
+        RATE_LIMIT_THROTTLED_CHATS.track(
+            lambda: self._throttled_chats(name), client=name
+        )
+        logger.info(f"已为客户端 {name} 启用请求限速")
+        return self
+
+    # ------------------------------------------------------------------
+    # 令牌桶
+    # ------------------------------------------------------------------
+    def _bucket(self, name, method):
+        key = (name, method)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.rates[method]
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            # 在运行指标中导出当前速率和暂停时间
+            RATE_LIMIT_RATE.track(lambda: bucket.rate, client=name, method=method)
+            RATE_LIMIT_BLOCKED.track(bucket.blocked_for, client=name, method=method)
+        return bucket
+
+    def _throttled_chats(self, name):
+        return sum(
+            1
+            for (client_name, _, _), bucket in list(self._chat_buckets.items())
+            if client_name == name and bucket.throttled
+        )
+
+    def _chat_bucket(self, name, method, chat_id):
+        if chat_id is None or method not in self.chat_rates:
+            return None
+        key = (name, method, chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.chat_rates[method]
+            bucket = self._chat_buckets[key] = TokenBucket(rate, capacity)
+            while len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _classify(request):
+        """返回 (方法分类, 目标聊天ID)，无需限速的请求分类为None"""
+        first = request[0] if isinstance(request, (list, tuple)) else request
+        method = METHOD_CLASSES.get(type(first))
+        if method is None:
+            return None, None
+        peer = getattr(first, "to_peer", None) or getattr(first, "peer", None)
+        try:
+            chat_id = utils.get_peer_id(peer) if peer is not None else None
+        except (TypeError, ValueError):
+            chat_id = None
+        return method, chat_id
+
+    # ------------------------------------------------------------------
+    # 请求
+    # ------------------------------------------------------------------
+    async def _call(self, name, original_call, sender, request, ordered):
+        method, chat_id = self._classify(request)
+        buckets = []
+        if method is not None:
+            buckets = [self._bucket(name, "client"), self._bucket(name, method)]
+            chat_bucket = self._chat_bucket(name, method, chat_id)
+            if chat_bucket is not None:
+                buckets.append(chat_bucket)
+
+        for attempt in range(self.max_retries + 1):
+            for bucket in buckets:
+                await bucket.acquire()
+            try:
+                result = await original_call(
+                    sender, request, ordered=ordered, flood_sleep_threshold=0
+                )
+            except (errors.FloodWaitError, errors.SlowModeWaitError) as e:
+                seconds = max(1, e.seconds)
+                label = method or type(request).__name__
+                FLOOD_WAITS.inc(client=name, method=label)
+                FLOOD_WAIT_SECONDS.inc(seconds, client=name, method=label)
+                if attempt >= self.max_retries or seconds > self.max_flood_wait:
+                    raise
+                logger.warning(
+                    f"{name} 的 {label} 请求遇到速率限制，等待 {seconds} 秒后重试"
+                )
+                if isinstance(e, errors.SlowModeWaitError):
+                    # 慢速模式只针对当前聊天
+                    if len(buckets) > 2:
+                        buckets[2].slow_down(seconds)
+                    else:
+                        await asyncio.sleep(seconds)
+                elif buckets:
+                    buckets[1].slow_down(seconds)
+                    for bucket in buckets[2:]:
+                        bucket.slow_down(block=False)
+                else:
+                    await asyncio.sleep(seconds)
+                continue
+
+            for bucket in buckets[1:]:
+                bucket.recover()
+            return result
@@ -1,6 +1,9 @@
 import logging
+from datetime import datetime
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from .metrics import SCHEDULED_MESSAGES, SCHEDULED_DELAY
 
 logger = logging.getLogger(__name__)
 
@@ -8,13 +11,27 @@ logger = logging.getLogger(__name__)
 class SchedulerService:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_listener(
+            self._on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED
+        )
+
+    def _on_job_event(self, event):
+        """记录任务相对计划时间的延迟，以及错过执行时间的任务"""
+        if event.code == EVENT_JOB_MISSED:
+            SCHEDULED_MESSAGES.inc(status="missed")
+            return
+        for run_time in event.scheduled_run_times:
+            delay = (datetime.now(run_time.tzinfo) - run_time).total_seconds()
+            SCHEDULED_DELAY.observe(max(0.0, delay))
 
     async def send_scheduled_message(self, client, chat_id, message):
         """发送定时消息"""
         try:
             await client.send_message(chat_id, message)
+            SCHEDULED_MESSAGES.inc(status="success")
             logger.info(f"成功发送定时消息到 {chat_id}")
         except Exception as e:
+            SCHEDULED_MESSAGES.inc(status="error")
             logger.error(f"发送定时消息到 {chat_id} 失败: {str(e)}")
 
     def initialize_tasks(self, client, scheduled_messages):
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from ..constants import CONFIG_DIR
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_resolver = None
+
+
+def get_short_link_resolver(options=None):
+    """获取全局共享的短链接解析器，首次调用时创建并从磁盘加载"""
+    global _resolver
+    if _resolver is None:
+        options = options or {}
+        _resolver = ShortLinkResolver(
+            path=os.path.join(CONFIG_DIR, "short_links.json"),
+            ttl=options.get("ttl_hours", 24 * 7) * 3600,
+            max_size=options.get("max_size", 10000),
+        )
+    return _resolver
+
+
+def _normalize_url(url):
+    """去掉首尾空白和末尾的斜杠，使同一链接的不同写法共用缓存"""
+    return url.strip().rstrip("/")
+
+
+class ShortLinkResolver:
+    """短链接解析缓存
+
+    缓存 短链接 → 作品ID（如 b23.tv → BV号、v.douyin.com → aweme_id），
+    带过期时间并持久化到磁盘；同一链接的并发解析会合并为一次请求。
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_size=10000, save_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.save_interval = save_interval
+        # url -> (id, 解析时间)，按最近使用排序
+        self._cache = OrderedDict()
+        # url -> 正在进行的解析任务
+        self._pending = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def __len__(self):
+        return len(self._cache)
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                records = json.load(file)
+            now = time.time()
+            # 文件按最近使用顺序保存，加载后保持同样的淘汰顺序
+            for url, (value, ts) in records.items():
+                if now - ts <= self.ttl:
+                    self._cache[url] = (value, ts)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+            logger.info(f"已加载短链接缓存: {len(self._cache)} 条记录")
+        except Exception as e:
+            logger.error(f"加载短链接缓存失败: {str(e)}")
+
+    def save(self):
+        """原子写入缓存文件"""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._cache, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except Exception as e:
+            logger.error(f"保存短链接缓存失败: {str(e)}")
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    # ------------------------------------------------------------------
+    # 解析
+    # ------------------------------------------------------------------
+    def get(self, url):
+        """查询缓存，未命中或已过期时返回None"""
+        key = _normalize_url(url)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        value, ts = entry
+        if time.time() - ts > self.ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def put(self, url, value):
+        key = _normalize_url(url)
+        self._cache[key] = (value, time.time())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            # 淘汰最久未使用的记录
+            self._cache.popitem(last=False)
+        self._dirty = True
+        self._maybe_save()
+
+    async def resolve(self, url, fetch):
+        """解析短链接
+
+        Args:
+            url: 短链接
+            fetch: 协程函数 fetch(url)，缓存未命中时实际解析，返回ID或None
+
+        Returns:
+            解析得到的ID，失败时返回None（失败结果不缓存）
+        """
+        value = self.get(url)
+        if value is not None:
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="short_link", result="hit")
+            return value
+
+        key = _normalize_url(url)
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="short_link", result="miss")
+            task = asyncio.ensure_future(fetch(url))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            # 同一链接正在解析，等待同一个结果
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="short_link", result="coalesced")
+
+        value = await asyncio.shield(task)
+        if value is not None:
+            self.put(url, value)
+        return value
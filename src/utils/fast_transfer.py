@@ -0,0 +1,279 @@
+import os
+import asyncio
+import logging
+from telethon import utils, helpers
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+from telethon.tl.functions import InvokeWithLayerRequest
+from telethon.tl.functions.auth import (
+    ExportAuthorizationRequest,
+    ImportAuthorizationRequest,
+)
+from telethon.tl.functions.upload import GetFileRequest, SaveBigFilePartRequest
+from telethon.tl.types import InputFileBig
+
+logger = logging.getLogger(__name__)
+
+# GetFileRequest 的 limit 必须能被 4KB 整除，且 1MB 能被其整除
+MAX_PART_SIZE = 1024 * 1024
+# SaveBigFilePartRequest 的分片最大 512KB
+MAX_UPLOAD_PART_SIZE = 512 * 1024
+# 超过该大小的文件必须使用 SaveBigFilePartRequest 上传
+BIG_FILE_SIZE = 10 * 1024 * 1024
+DEFAULT_PART_SIZE = 512 * 1024
+DEFAULT_CONNECTIONS = 4
+PART_RETRIES = 3
+
+
+class PartTransferError(Exception):
+    """某个分片重试后仍然失败，整个并行传输放弃
+
+    Attributes:
+        index: 失败的分片序号
+        action: 操作名称，如"下载"、"上传"
+        part_retries: 放弃前各分片的重试次数 {分片序号: 重试次数}
+    """
+
+    def __init__(self, index, action, part_retries, cause):
+        super().__init__(
+            f"分片 {index} {action}失败（已重试 {PART_RETRIES} 次）: {str(cause)}"
+        )
+        self.index = index
+        self.action = action
+        self.part_retries = part_retries
+
+
+def _normalize_part_size(part_size, max_size):
+    """把分片大小调整为 Telegram 接受的值（4KB 的 2^n 倍，不超过 max_size）"""
+    size = 4096
+    while size * 2 <= min(part_size, max_size):
+        size *= 2
+    return size
+
+
+async def _create_sender(client, dc_id):
+    """创建一个连接到指定 DC 的独立 MTProtoSender"""
+    dc = await client._get_dc(dc_id)
+    same_dc = dc_id == client.session.dc_id
+    sender = MTProtoSender(
+        client.session.auth_key if same_dc else None, loggers=client._log
+    )
+    await sender.connect(
+        client._connection(
+            dc.ip_address,
+            dc.port,
+            dc.id,
+            loggers=client._log,
+            proxy=client._proxy,
+            local_addr=client._local_addr,
+        )
+    )
+    if not same_dc:
+        # 其他 DC 需要导入当前账号的授权
+        auth = await client(ExportAuthorizationRequest(dc_id))
+        client._init_request.query = ImportAuthorizationRequest(
+            id=auth.id, bytes=auth.bytes
+        )
+        await sender.send(InvokeWithLayerRequest(LAYER, client._init_request))
+    return sender
+
+
+async def create_senders(client, dc_id, count):
+    """并发创建多个到同一 DC 的连接，任一连接失败时关闭已建立的连接"""
+    results = await asyncio.gather(
+        *(_create_sender(client, dc_id) for _ in range(count)),
+        return_exceptions=True,
+    )
+    senders = [result for result in results if not isinstance(result, BaseException)]
+    if len(senders) < len(results):
+        await close_senders(senders)
+        raise next(result for result in results if isinstance(result, BaseException))
+    return senders
+
+
+async def close_senders(senders):
+    await asyncio.gather(
+        *(sender.disconnect() for sender in senders), return_exceptions=True
+    )
+
+
+async def _transfer_parts(senders, part_count, transfer_part, action):
+    """由多个连接从共享队列中领取分片并执行，单个分片失败时重试
+
+    Args:
+        senders: 连接列表，每个连接一个worker
+        part_count: 分片总数
+        transfer_part: 协程函数 transfer_part(sender, index)
+        action: 日志中的操作名称，如"下载"、"上传"
+
+    Returns:
+        {分片序号: 重试次数}，只包含发生过重试的分片
+
+    Raises:
+        PartTransferError: 某个分片重试 PART_RETRIES 次后仍然失败
+    """
+    parts = asyncio.Queue()
+    for index in range(part_count):
+        parts.put_nowait(index)
+    part_retries = {}
+
+    async def worker(sender):
+        while True:
+            try:
+                index = parts.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for attempt in range(PART_RETRIES + 1):
+                try:
+                    await transfer_part(sender, index)
+                    break
+                except Exception as e:
+                    if attempt >= PART_RETRIES:
+                        logger.error(
+                            f"分片 {index} {action}失败，已重试 {PART_RETRIES} 次，放弃: {str(e)}"
+                        )
+                        raise PartTransferError(
+                            index, action, dict(part_retries), e
+                        ) from e
+                    part_retries[index] = attempt + 1
+                    logger.warning(
+                        f"分片 {index} {action}失败，重试第 {attempt + 1} 次: {str(e)}"
+                    )
+                    await asyncio.sleep(1)
+
+    await asyncio.gather(*(worker(sender) for sender in senders))
+    return part_retries
+
+
+def _format_retries(part_retries):
+    if not part_retries:
+        return "无重试"
+    detail = ", ".join(
+        f"#{index}×{count}" for index, count in sorted(part_retries.items())
+    )
+    return f"重试 {sum(part_retries.values())} 次（{detail}）"
+
+
+async def download_file_parallel(
+    client,
+    media,
+    path,
+    part_size=DEFAULT_PART_SIZE,
+    connections=DEFAULT_CONNECTIONS,
+    progress_callback=None,
+):
+    """通过多个连接并行下载文件，各分片直接写入预分配文件的对应位置
+
+    Args:
+        client: Telegram客户端
+        media: 消息的媒体（MessageMediaDocument）或 Document
+        path: 保存路径
+        part_size: 分片大小（字节），会被调整为 Telegram 接受的值
+        connections: 并行连接数
+        progress_callback: 可选的回调 callback(已下载字节数, 总字节数)
+
+    Returns:
+        (下载路径, {分片序号: 重试次数})
+    """
+    document = getattr(media, "document", media)
+    size = document.size
+    dc_id, location = utils.get_input_location(media)
+    part_size = _normalize_part_size(part_size, MAX_PART_SIZE)
+    part_count = (size + part_size - 1) // part_size
+    connections = max(1, min(connections, part_count))
+    downloaded = 0
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    senders = []
+    try:
+        # 预分配文件，各分片按偏移写入，无需按顺序到达
+        os.ftruncate(fd, size)
+        senders = await create_senders(client, dc_id, connections)
+
+        async def download_part(sender, index):
+            nonlocal downloaded
+            offset = index * part_size
+            result = await client._call(
+                sender, GetFileRequest(location, offset=offset, limit=part_size)
+            )
+            await asyncio.to_thread(os.pwrite, fd, result.bytes, offset)
+            downloaded += len(result.bytes)
+            if progress_callback:
+                progress_callback(min(downloaded, size), size)
+
+        part_retries = await _transfer_parts(senders, part_count, download_part, "下载")
+    except BaseException:
+        os.close(fd)
+        fd = None
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        if fd is not None:
+            os.close(fd)
+        await close_senders(senders)
+
+    logger.info(
+        f"并行下载完成: {os.path.basename(path)}，{part_count} 个分片，"
+        f"{connections} 个连接，{_format_retries(part_retries)}"
+    )
+    return path, part_retries
+
+
+async def upload_file_parallel(
+    client,
+    path,
+    part_size=DEFAULT_PART_SIZE,
+    connections=DEFAULT_CONNECTIONS,
+    progress_callback=None,
+):
+    """通过多个连接并行上传大文件（SaveBigFilePart），返回可直接用于 send_file 的 InputFileBig
+
+    只适用于大于 10MB 的文件，更小的文件请使用 client.upload_file。
+
+    Args:
+        client: Telegram客户端
+        path: 本地文件路径
+        part_size: 分片大小（字节），会被调整为 Telegram 接受的值（最大 512KB）
+        connections: 并行连接数
+        progress_callback: 可选的回调 callback(已上传字节数, 总字节数)
+
+    Returns:
+        (InputFileBig, {分片序号: 重试次数})
+    """
+    size = os.path.getsize(path)
+    if size <= BIG_FILE_SIZE:
+        raise ValueError("并行上传只支持大于 10MB 的文件")
+    part_size = _normalize_part_size(part_size, MAX_UPLOAD_PART_SIZE)
+    part_count = (size + part_size - 1) // part_size
+    connections = max(1, min(connections, part_count))
+    file_id = helpers.generate_random_long()
+    uploaded = 0
+
+    fd = os.open(path, os.O_RDONLY)
+    senders = []
+    try:
+        # 上传总是发往账号所在的 DC
+        senders = await create_senders(client, client.session.dc_id, connections)
+
+        async def upload_part(sender, index):
+            nonlocal uploaded
+            data = await asyncio.to_thread(os.pread, fd, part_size, index * part_size)
+            await client._call(
+                sender,
+                SaveBigFilePartRequest(file_id, index, part_count, data),
+            )
+            uploaded += len(data)
+            if progress_callback:
+                progress_callback(min(uploaded, size), size)
+
+        part_retries = await _transfer_parts(senders, part_count, upload_part, "上传")
+    finally:
+        os.close(fd)
+        await close_senders(senders)
+
+    logger.info(
+        f"并行上传完成: {os.path.basename(path)}，{part_count} 个分片，"
+        f"{connections} 个连接，{_format_retries(part_retries)}"
+    )
+    return InputFileBig(file_id, part_count, os.path.basename(path)), part_retries
@@ -1,7 +1,7 @@
 import os
 import re
-import shutil
 import logging
+from .storage import publish_file
 
 logger = logging.getLogger(__name__)
 
@@ -21,11 +21,14 @@ def ensure_dirs(*dirs):
 
 
 def move_file(source_path, target_path, create_dirs=True):
-    """移动文件到目标位置"""
+    """移动文件到目标位置
+
+    同一文件系统内原子 rename，跨设备时流式复制后再 rename（会阻塞，
+    在事件循环中请使用 storage.publish）。
+    """
     try:
         if create_dirs:
             os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        shutil.move(source_path, target_path)
-        return True, target_path
+        return True, publish_file(source_path, target_path)
     except Exception as e:
         return False, str(e)
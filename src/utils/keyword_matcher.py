@@ -0,0 +1,148 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 以该前缀开头的关键词按正则表达式处理
+REGEX_PREFIX = "re:"
+
+
+class _Automaton:
+    """Aho-Corasick 自动机，一次扫描即可找出文本中出现的全部模式"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        # 状态转移缓存（已合并失败指针），扫描时每个字符只需一次字典查询
+        self._delta = [{}]
+
+    def add(self, pattern, pattern_id):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._delta.append({})
+            state = nxt
+        self._output[state] = self._output[state] + (pattern_id,)
+
+    def build(self):
+        """广度优先计算失败指针，并把失败状态的输出合并到当前状态"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = fail_target if fail_target != nxt else 0
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def _transition(self, state, ch):
+        origin = state
+        while state and ch not in self._goto[state]:
+            state = self._fail[state]
+        nxt = self._goto[state].get(ch, 0)
+        self._delta[origin][ch] = nxt
+        return nxt
+
+    def scan(self, text, hits):
+        delta = self._delta
+        output = self._output
+        state = 0
+        for ch in text:
+            nxt = delta[state].get(ch)
+            if nxt is None:
+                nxt = self._transition(state, ch)
+            state = nxt
+            if output[state]:
+                hits.update(output[state])
+
+
+class KeywordMatcher:
+    """多模式关键词匹配器
+
+    所有规则的关键词编译进同一个匹配器，每条消息只需扫描一次即可得到
+    命中的全部关键词ID。普通关键词使用 Aho-Corasick 自动机匹配，
+    以 ``re:`` 开头的关键词按正则表达式匹配（不是有效的正则表达式时按普通文本
+    匹配）；ignore_case 为 True 时忽略大小写。
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._automaton = _Automaton()
+        self._folded_automaton = _Automaton()
+        self._has_literal = False
+        self._has_folded = False
+        self._regexes = []
+        # 空关键词对任何文本都成立（与 "" in text 的行为一致）
+        self._always = set()
+        self._built = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, keyword, ignore_case=False):
+        """添加关键词，返回其ID；相同的关键词只会编译一次"""
+        keyword = str(keyword)
+        key = (keyword, bool(ignore_case))
+        if key in self._ids:
+            return self._ids[key]
+
+        pattern_id = len(self._ids)
+        self._ids[key] = pattern_id
+        self._built = False
+
+        if keyword.startswith(REGEX_PREFIX):
+            flags = re.IGNORECASE if ignore_case else 0
+            try:
+                self._regexes.append(
+                    (pattern_id, re.compile(keyword[len(REGEX_PREFIX) :], flags))
+                )
+                return pattern_id
+            except re.error as e:
+                # 兼容旧配置：以前 re: 开头的关键词按普通文本匹配
+                logger.warning(
+                    f"关键词不是有效的正则表达式，按普通文本匹配: {keyword} ({str(e)})"
+                )
+
+        if not keyword:
+            self._always.add(pattern_id)
+        elif ignore_case:
+            self._folded_automaton.add(keyword.casefold(), pattern_id)
+            self._has_folded = True
+        else:
+            self._automaton.add(keyword, pattern_id)
+            self._has_literal = True
+        return pattern_id
+
+    def build(self):
+        """编译自动机，添加完全部关键词后调用"""
+        self._automaton.build()
+        self._folded_automaton.build()
+        self._built = True
+
+    def scan(self, text):
+        """扫描文本，返回命中的关键词ID集合"""
+        if not self._built:
+            self.build()
+        hits = set(self._always)
+        if not text:
+            return hits
+        if self._has_literal:
+            self._automaton.scan(text, hits)
+        if self._has_folded:
+            self._folded_automaton.scan(text.casefold(), hits)
+        for pattern_id, regex in self._regexes:
+            if regex.search(text):
+                hits.add(pattern_id)
+        return hits
@@ -0,0 +1,227 @@
+import os
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 工作线程向事件循环投递进度的最小间隔（秒）
+_THREAD_POST_INTERVAL = 0.5
+
+
+def format_size(size):
+    """格式化字节数"""
+    size = float(size or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+
+def format_duration(seconds):
+    """格式化剩余时间"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def format_progress(current, total, speed=None, eta=None):
+    """生成一行进度文本，例如：45.2% 12.0 MB/26.5 MB 2.1 MB/s 剩余 00:07"""
+    parts = []
+    if total:
+        parts.append(f"{current * 100 / total:.1f}%")
+        parts.append(f"{format_size(current)}/{format_size(total)}")
+    else:
+        parts.append(format_size(current))
+    if speed:
+        parts.append(f"{format_size(speed)}/s")
+    if eta is not None:
+        parts.append(f"剩余 {format_duration(eta)}")
+    return " ".join(parts)
+
+
+class _Speedometer:
+    """根据累计字节数估算速度（指数滑动平均）"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.last_time = self.start
+        self.last_bytes = 0
+        self.speed = None
+
+    def update(self, current):
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed >= 0.5:
+            instant = (current - self.last_bytes) / elapsed
+            self.speed = (
+                instant if self.speed is None else 0.3 * instant + 0.7 * self.speed
+            )
+            self.last_time = now
+            self.last_bytes = current
+        return self.speed
+
+
+class ProgressReporter:
+    """状态消息进度汇报器
+
+    把频繁的状态/进度更新合并为对同一条消息的编辑：每 interval 秒最多编辑一次，
+    文本没有变化时不编辑，避免触发 Telegram 的编辑频率限制。
+    可以直接作为 yt-dlp 的 progress_hooks、Telethon 的 progress_callback 使用，
+    也可以在下载循环中调用 report()。
+    """
+
+    def __init__(self, edit, interval=3.0):
+        """
+        Args:
+            edit: 编辑状态消息的协程函数，如 status_message.edit
+            interval: 两次编辑之间的最小间隔（秒）
+        """
+        self._edit = edit
+        self.interval = interval
+        self._loop = asyncio.get_running_loop()
+        self._status = ""
+        # label -> 进度行，多个并发下载各占一行
+        self._lines = {}
+        self._speedometers = {}
+        self._thread_posts = {}
+        self._last_text = None
+        self._last_edit = 0.0
+        self._handle = None
+        self._editing = False
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # 更新接口
+    # ------------------------------------------------------------------
+    def set_status(self, text):
+        """更新状态文本（进度行之上的标题）"""
+        self._status = text or ""
+        self._schedule()
+
+    def set_status_threadsafe(self, text):
+        """在工作线程中更新状态文本"""
+        self._post(self.set_status, text)
+
+    async def status(self, text):
+        """协程形式的 set_status，可直接作为 status_callback 使用"""
+        self.set_status(text)
+
+    def report(self, current, total=None, label="", speed=None, eta=None):
+        """汇报字节进度；未提供速度和剩余时间时自动估算"""
+        if speed is None:
+            speedometer = self._speedometers.get(label)
+            if speedometer is None:
+                speedometer = self._speedometers[label] = _Speedometer()
+            speed = speedometer.update(current)
+        if eta is None and speed and total:
+            eta = max(0, total - current) / speed
+        line = format_progress(current, total, speed, eta)
+        self._lines[label] = f"{label}: {line}" if label else line
+        self._schedule()
+
+    def done(self, label=""):
+        """某个下载项完成，移除其进度行"""
+        self._lines.pop(label, None)
+        self._speedometers.pop(label, None)
+        self._schedule()
+
+    def telethon_callback(self, label=""):
+        """生成 Telethon 的 progress_callback(current, total)"""
+
+        def callback(current, total):
+            self.report(current, total, label)
+
+        return callback
+
+    def threadsafe_callback(self, label=""):
+        """生成可在工作线程中调用的 callback(current, total)"""
+
+        def callback(current, total):
+            now = time.monotonic()
+            if current < total and (
+                now - self._thread_posts.get(label, 0) < _THREAD_POST_INTERVAL
+            ):
+                return
+            self._thread_posts[label] = now
+            self._post(self.report, current, total, label)
+
+        return callback
+
+    def ytdlp_hook(self, d):
+        """yt-dlp 的 progress_hooks 回调（在工作线程中调用）"""
+        info = d.get("info_dict") or {}
+        label = info.get("title") or os.path.basename(d.get("filename") or "")
+        status = d.get("status")
+        if status == "downloading":
+            now = time.monotonic()
+            if now - self._thread_posts.get(label, 0) < _THREAD_POST_INTERVAL:
+                return
+            self._thread_posts[label] = now
+            self._post(
+                self.report,
+                d.get("downloaded_bytes") or 0,
+                d.get("total_bytes") or d.get("total_bytes_estimate"),
+                label,
+                d.get("speed"),
+                d.get("eta"),
+            )
+        elif status in ("finished", "error"):
+            self._thread_posts.pop(label, None)
+            self._post(self.done, label)
+
+    def _post(self, func, *args):
+        """从工作线程把更新投递回事件循环"""
+        try:
+            self._loop.call_soon_threadsafe(func, *args)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    # ------------------------------------------------------------------
+    # 合并编辑
+    # ------------------------------------------------------------------
+    def render(self):
+        return "\n".join(filter(None, (self._status, *self._lines.values())))
+
+    def _schedule(self, min_delay=0.0):
+        if self._closed or self._handle is not None:
+            return
+        delay = max(min_delay, self._last_edit + self.interval - time.monotonic())
+        self._handle = self._loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        if self._closed:
+            return
+        if self._editing:
+            # 上一次编辑尚未完成，稍后再试
+            self._schedule(min_delay=0.5)
+            return
+        text = self.render()
+        if not text or text == self._last_text:
+            return
+        self._last_text = text
+        self._last_edit = time.monotonic()
+        self._editing = True
+        self._loop.create_task(self._do_edit(text))
+
+    async def _do_edit(self, text):
+        try:
+            await self._edit(text)
+        except Exception as e:
+            logger.debug(f"更新状态消息失败: {str(e)}")
+        finally:
+            self._editing = False
+
+    def close(self):
+        """停止汇报，丢弃尚未发送的更新"""
+        self._closed = True
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
@@ -0,0 +1,214 @@
+import os
+import errno
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 跨设备复制时每次系统调用复制的字节数，也是进度汇报的粒度
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# 目标目录所在文件系统上的暂存目录名
+STAGING_DIR_NAME = ".incomplete"
+# 这些错误表示当前复制方式不支持这对文件，换下一种方式
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+}
+
+
+# (源目录, 目标目录) -> 能否直接 rename
+_rename_probes = {}
+# 本进程中已清理过残留文件的暂存目录
+_cleared_staging_dirs = set()
+# 进程启动时间，早于此时间的 .part 文件一定是上次运行留下的
+_STARTED_AT = time.time()
+
+
+def can_rename(source_dir, dest_dir):
+    """两个目录之间能否直接 rename
+
+    不能只比较 st_dev：同一文件系统的两个 docker bind mount 设备号相同，
+    但跨挂载点 rename 仍会失败（EXDEV），因此用一个空文件实际试一次并缓存结果。
+    """
+    key = (os.path.abspath(source_dir), os.path.abspath(dest_dir))
+    result = _rename_probes.get(key)
+    if result is None:
+        os.makedirs(source_dir, exist_ok=True)
+        os.makedirs(dest_dir, exist_ok=True)
+        fd, probe_path = tempfile.mkstemp(prefix=".rename_probe_", dir=source_dir)
+        os.close(fd)
+        target_path = os.path.join(dest_dir, os.path.basename(probe_path))
+        try:
+            os.rename(probe_path, target_path)
+            os.remove(target_path)
+            result = True
+        except OSError:
+            os.remove(probe_path)
+            result = False
+        _rename_probes[key] = result
+    return result
+
+
+def staging_dir(dest_dir, temp_dir):
+    """返回与 dest_dir 位于同一文件系统的暂存目录
+
+    temp_dir 能直接 rename 到目标目录时使用 temp_dir；否则（例如两者是
+    不同的 docker 挂载卷）在目标目录下创建隐藏的暂存目录，下载完成后只需一次
+    rename 即可发布。
+    """
+    if can_rename(temp_dir, dest_dir):
+        path = temp_dir
+    else:
+        path = os.path.join(dest_dir, STAGING_DIR_NAME, os.path.basename(temp_dir))
+        if path not in _cleared_staging_dirs:
+            _cleared_staging_dirs.add(path)
+            clear_stale_staging(path, dest_dir)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def clear_stale_staging(path, dest_dir):
+    """清理上次运行因崩溃或取消遗留的暂存文件
+
+    暂存目录只在本进程中首次使用前清理一次，此时其中的内容都是残留；
+    目标目录下跨设备复制的 .part 临时文件只删除进程启动前的，
+    以免误删正在复制的文件。
+    """
+    removed = 0
+    if os.path.isdir(path):
+        for entry in os.scandir(path):
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"清理暂存文件失败: {entry.path}: {str(e)}")
+    if os.path.isdir(dest_dir):
+        for entry in os.scandir(dest_dir):
+            try:
+                if (
+                    entry.name.endswith(".part")
+                    and entry.is_file(follow_symlinks=False)
+                    and entry.stat().st_mtime < _STARTED_AT
+                ):
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"清理暂存文件失败: {entry.path}: {str(e)}")
+    if removed:
+        logger.info(f"已清理 {removed} 个遗留的暂存文件: {path}")
+
+
+def _copy_with_copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _copy_with_sendfile(src_fd, dst_fd, offset, count):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _copy_with_read_write(src_fd, dst_fd, offset, count):
+    data = os.pread(src_fd, count, offset)
+    view = memoryview(data)
+    while view:
+        view = view[os.pwrite(dst_fd, view, offset + len(data) - len(view)) :]
+    return len(data)
+
+
+def _copy_methods():
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(_copy_with_copy_file_range)
+    if hasattr(os, "sendfile"):
+        methods.append(_copy_with_sendfile)
+    methods.append(_copy_with_read_write)
+    return methods
+
+
+def copy_file(source_path, target_path, progress_callback=None):
+    """在内核中流式复制文件（copy_file_range → sendfile → read/write 逐级回退）
+
+    Args:
+        progress_callback: 可选的 callback(已复制字节数, 总字节数)
+    """
+    size = os.path.getsize(source_path)
+    methods = _copy_methods()
+    src_fd = os.open(source_path, os.O_RDONLY)
+    try:
+        dst_fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            copied = 0
+            while copied < size:
+                count = min(COPY_CHUNK_SIZE, size - copied)
+                try:
+                    written = methods[0](src_fd, dst_fd, copied, count)
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS or len(methods) == 1:
+                        raise
+                    logger.debug(f"{methods[0].__name__} 不可用，改用下一种复制方式")
+                    methods.pop(0)
+                    continue
+                if written == 0:
+                    raise OSError(f"复制中断: {copied}/{size}")
+                copied += written
+                if progress_callback:
+                    progress_callback(copied, size)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(source_path, target_path)
+
+
+def publish_file(source_path, target_path, progress_callback=None):
+    """把暂存文件发布到目标位置
+
+    同一文件系统内直接原子 rename；跨设备时先复制到目标目录下的临时文件，
+    再 rename 到目标路径，目标路径上不会出现写了一半的文件。会阻塞，
+    在事件循环中请使用 publish()。
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    try:
+        os.replace(source_path, target_path)
+        return target_path
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    size = os.path.getsize(source_path)
+    logger.info(
+        f"跨设备复制文件 ({size / 1024 / 1024:.1f} MB): {os.path.basename(target_path)}"
+    )
+    part_path = f"{target_path}.part"
+    try:
+        copy_file(source_path, part_path, progress_callback)
+        os.replace(part_path, target_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.remove(source_path)
+    return target_path
+
+
+async def publish(source_path, target_path, progress=None, label="保存"):
+    """publish_file 的异步版本，在线程中执行，不阻塞事件循环
+
+    Args:
+        progress: 可选的 ProgressReporter，跨设备复制时汇报进度
+    """
+    callback = progress.threadsafe_callback(label) if progress else None
+    try:
+        return await asyncio.to_thread(publish_file, source_path, target_path, callback)
+    finally:
+        if progress:
+            progress.done(label)
@@ -0,0 +1,52 @@
+import io
+import logging
+from telethon import errors
+
+logger = logging.getLogger(__name__)
+
+# 媒体引用无法复用时服务器返回的错误
+_REFERENCE_ERRORS = (
+    errors.ChatForwardsRestrictedError,
+    errors.FileReferenceExpiredError,
+    errors.FileReferenceInvalidError,
+    errors.MediaEmptyError,
+)
+
+
+def is_protected(message):
+    """消息是否来自开启了内容保护（禁止转发）的聊天"""
+    if getattr(message, "noforwards", False):
+        return True
+    chat = getattr(message, "chat", None)
+    return bool(getattr(chat, "noforwards", False))
+
+
+async def download_to_buffer(client, message):
+    """将消息中的照片下载到内存，返回可直接发送的文件对象"""
+    buffer = io.BytesIO()
+    await client.download_media(message, file=buffer)
+    # Telethon 根据 name 判断文件类型
+    buffer.name = f"photo_{message.id}.jpg"
+    buffer.seek(0)
+    return buffer
+
+
+async def send_media_copy(client, send, messages):
+    """重新发送消息中的媒体，不经过本地磁盘
+
+    优先直接复用原消息的媒体对象（文件引用），无需下载和重新上传；
+    来自受保护聊天或引用已失效时，再下载到内存后发送。
+
+    Args:
+        client: 用于下载媒体的客户端
+        send: 协程函数，参数为文件列表（与 messages 一一对应），负责实际发送
+        messages: 包含媒体的消息列表
+    """
+    if not any(is_protected(message) for message in messages):
+        try:
+            return await send([message.media for message in messages])
+        except _REFERENCE_ERRORS as e:
+            logger.info(f"媒体引用无法直接复用，改为下载后发送: {str(e)}")
+
+    buffers = [await download_to_buffer(client, message) for message in messages]
+    return await send(buffers)
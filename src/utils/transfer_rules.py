@@ -0,0 +1,141 @@
+import logging
+from .keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class TransferRule:
+    """单条消息转发规则（启动时预处理，避免每条消息重复解析配置）"""
+
+    __slots__ = (
+        "index",
+        "source_chat",
+        "target_chat",
+        "include_keywords",
+        "exclude_words",
+        "direct",
+        "ignore_case",
+        "include_ids",
+        "exclude_ids",
+    )
+
+    def __init__(self, index, transfer):
+        self.index = index
+        self.source_chat = transfer.get("source_chat")
+        self.target_chat = transfer.get("target_chat")
+        self.include_keywords = list(transfer.get("include_keywords") or [])
+        self.exclude_words = list(transfer.get("exclude_words") or [])
+        self.direct = transfer.get("direct", False)
+        self.ignore_case = transfer.get("ignore_case", False)
+        self.include_ids = frozenset()
+        self.exclude_ids = frozenset()
+
+    def compile(self, matcher):
+        """将关键词注册到共享的匹配器中"""
+        self.include_ids = frozenset(
+            matcher.add(word, self.ignore_case) for word in self.include_keywords
+        )
+        self.exclude_ids = frozenset(
+            matcher.add(word, self.ignore_case) for word in self.exclude_words
+        )
+
+    @property
+    def has_keywords(self):
+        return bool(self.include_ids or self.exclude_ids)
+
+    def is_excluded(self, hits):
+        """消息是否命中排除词"""
+        return bool(self.exclude_ids) and not self.exclude_ids.isdisjoint(hits)
+
+    def is_included(self, hits):
+        """消息是否满足包含词条件（未配置包含词时总是满足）"""
+        return not self.include_ids or not self.include_ids.isdisjoint(hits)
+
+
+def _normalize_source(source_chat):
+    """将source_chat转换为索引键：数字ID返回 ("id", int)，@用户名返回 ("username", 小写用户名)"""
+    if source_chat is None or source_chat == "":
+        return None
+    if isinstance(source_chat, int):
+        return "id", source_chat
+    source_chat = str(source_chat).strip()
+    if source_chat.lstrip("-").isdigit():
+        return "id", int(source_chat)
+    if source_chat.startswith("@") and len(source_chat) > 1:
+        return "username", source_chat[1:].lower()
+    return None
+
+
+class TransferRuleIndex:
+    """按源聊天编译的转发规则索引
+
+    启动时按数字chat_id和用户名分别建立索引，收到消息时只需一次字典查询即可
+    判断是否有规则匹配，不匹配的消息无需请求网络获取聊天信息。
+    所有规则的关键词编译进同一个 KeywordMatcher，每条消息只扫描一次。
+    """
+
+    def __init__(self, transfer_config):
+        self.rules = []
+        self.matcher = KeywordMatcher()
+        self._by_id = {}
+        self._by_username = {}
+        # chat_id -> 该聊天命中的全部规则（含用户名规则），首次解析后缓存
+        self._resolved = {}
+
+        for idx, transfer in enumerate(transfer_config or []):
+            rule = TransferRule(idx, transfer)
+            key = _normalize_source(rule.source_chat)
+            if key is None:
+                logger.warning(
+                    f"转发规则 #{idx+1} 的 source_chat 无效: {rule.source_chat!r}，已忽略"
+                )
+                continue
+            rule.compile(self.matcher)
+            self.rules.append(rule)
+            kind, value = key
+            bucket = self._by_id if kind == "id" else self._by_username
+            bucket.setdefault(value, []).append(rule)
+
+        self.matcher.build()
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def has_username_rules(self):
+        """是否存在以@用户名指定源聊天的规则"""
+        return bool(self._by_username)
+
+    def scan(self, rules, message_text):
+        """扫描一次消息文本，返回命中的关键词ID集合；规则均未配置关键词时不扫描"""
+        if not any(rule.has_keywords for rule in rules):
+            return frozenset()
+        return self.matcher.scan(message_text)
+
+    def rules_for_id(self, chat_id):
+        """仅按数字chat_id查找规则"""
+        return self._by_id.get(chat_id, ())
+
+    def cached_rules_for(self, chat_id):
+        """返回已解析过的chat_id对应的规则；未解析过返回None"""
+        if not self._by_username:
+            return self._by_id.get(chat_id, ())
+        return self._resolved.get(chat_id)
+
+    def resolve(self, chat_id, username=None):
+        """结合chat_id和用户名解析规则，并缓存结果"""
+        rules = self._by_id.get(chat_id, ())
+        if username:
+            username_rules = self._by_username.get(username.lower())
+            if username_rules:
+                # 保持配置文件中的规则顺序
+                rules = sorted(
+                    {rule.index: rule for rule in (*rules, *username_rules)}.values(),
+                    key=lambda rule: rule.index,
+                )
+        rules = tuple(rules)
+        self._resolved[chat_id] = rules
+        return rules